@@ -0,0 +1,85 @@
+"""
+    Language detection shared by the extractor and the corrector.
+    Returns Tesseract language codes (eng, rus, ukr, ...).
+"""
+import re
+from pathlib import Path
+
+NAME_TOKEN = re.compile(r"[^\W\d_]+")  # letter runs: "Tolstoy_War_and_Peace_rus.pdf" → tolstoy, war, ..., rus, pdf
+
+
+def detect_language_from_filename(file_path: Path) -> str:
+    return language_tag_from_filename(file_path) or "eng"  # default fallback
+
+
+def language_tag_from_filename(file_path: Path) -> str | None:
+    """Language the file name explicitly names, None for untagged names."""
+    name = file_path.name.lower()
+
+    lang_keywords = {
+        # Cyrillic and Slavic
+        "rus": "rus", "russian": "rus", "рос": "rus",
+        "ukr": "ukr", "ukrainian": "ukr",
+        # "bul": "bul", "bulgarian": "bul",
+        # "srp": "srp", "serbian": "srp",
+        # "srp_latn": "srp_latn",
+        "bel": "bel", "belarusian": "bel",
+        # "kaz": "kaz", "kazakh": "kaz",
+        # "uzb": "uzb", "uzbek": "uzb",
+        # "uzb_cyrl": "uzb_cyrl",
+        # "kir": "kir", "kyrgyz": "kir",
+        # "tgk": "tgk", "tajik": "tgk",
+        # "tat": "tat", "tatar": "tat",
+        # "mkd": "mkd", "macedonian": "mkd",
+
+        # Western languages
+        "eng": "eng", "english": "eng",
+        # "deu": "deu", "ger": "deu", "german": "deu",
+        # "fra": "fra", "fre": "fra", "french": "fra",
+        # "ita": "ita", "italian": "ita",
+        # "spa": "spa", "spanish": "spa",
+        # "por": "por", "portuguese": "por",
+        "pol": "pol", "polish": "pol", "polska": "pol",
+        # "nld": "nld", "dutch": "nld",
+        # "swe": "swe", "swedish": "swe",
+        # "dan": "dan", "danish": "dan",
+        "nor": "nor", "norwegian": "nor",
+        # "fin": "fin", "finnish": "fin",
+
+        # # Asian languages
+        # "chi_sim": "chi_sim", "zh_cn": "chi_sim", "simplified": "chi_sim",
+        # "chi_tra": "chi_tra", "zh_tw": "chi_tra", "traditional": "chi_tra",
+        # "jpn": "jpn", "japanese": "jpn",
+        # "kor": "kor", "korean": "kor",
+        # "hin": "hin", "hindi": "hin",
+        # "tam": "tam", "tamil": "tam",
+        # "tel": "tel", "telugu": "tel",
+        # "kan": "kan", "kannada": "kan",
+        # "mal": "mal", "malayalam": "mal",
+        # "mya": "mya", "burmese": "mya",
+        # "tha": "tha", "thai": "tha",
+        # "vie": "vie", "vietnamese": "vie",
+
+        # Others
+        # "ara": "ara", "arabic": "ara",
+        # "heb": "heb", "hebrew": "heb",
+        # "grc": "grc", "greek": "ell",
+        # "ell": "ell", "modern_greek": "ell",
+        # "amh": "amh", "ethiopic": "amh",
+        # "ben": "ben", "bengali": "ben",
+        # "guj": "guj", "gujarati": "guj",
+        # "pan": "pan", "punjabi": "pan",
+        # "urd": "urd", "urdu": "urd",
+        # "syr": "syr", "syriac": "syr",
+        # "san": "san", "sanskrit": "san",
+        # "nep": "nep", "nepali": "nep",
+    }
+
+    # Whole words only, "eng" must not match "engineering" nor "rus" "trust";
+    # Cyrillic keys are stems ("рос" → "российский"), so those match as prefixes
+    tokens = NAME_TOKEN.findall(name)
+    for key, lang in lang_keywords.items():
+        for token in tokens:
+            if token == key or (not key.isascii() and token.startswith(key)):
+                return lang
+    return None
@@ -0,0 +1,97 @@
+"""
+    Shared logging setup for the pipeline scripts.
+    Console gets LOG_LEVEL and above (INFO by default) plus a periodic progress line,
+    per-item DEBUG records only go to logs/<name>.jsonl as one JSON object per line.
+        log = setup_logging("extract")
+        log.debug("[SKIP] Already extracted", extra={"fields": {"file": str(path)}})
+"""
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()  # read at import, some scripts import this before loading .env themselves
+
+LOG_DIR = Path(os.getenv("LOG_DIR", "logs"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "DEBUG").upper()
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "10")) # seconds between progress lines
+
+
+class JSONLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(name: str, log_dir: Path = LOG_DIR) -> logging.Logger:
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger  # already configured in this process
+    file_level = getattr(logging, LOG_FILE_LEVEL, logging.DEBUG)
+    console_level = getattr(logging, LOG_LEVEL, logging.INFO)
+    logger.setLevel(min(file_level, console_level))
+    logger.propagate = False
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(console_level)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(console)
+
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    structured = logging.FileHandler(log_dir / f"{name}.jsonl", encoding="utf-8")
+    structured.setLevel(file_level)
+    structured.setFormatter(JSONLinesFormatter())
+    logger.addHandler(structured)
+    return logger
+
+
+class Progress:
+    """
+    Rate-limited progress line: "[PROGRESS] extract 1200/5000 (24.0%) 35.2/s ETA 0:01:48".
+    update() only touches a counter and the clock, the line is logged at most every interval seconds.
+    """
+    def __init__(self, logger: logging.Logger, label: str, total: int | None = None,
+                 interval: float = PROGRESS_INTERVAL):
+        self.logger = logger
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.monotonic()
+        self._next_report = self.started + interval
+
+    def update(self, n: int = 1):
+        self.done += n
+        now = time.monotonic()
+        if now >= self._next_report:
+            self._next_report = now + self.interval
+            self.report(now)
+
+    def report(self, now: float | None = None):
+        elapsed = (now or time.monotonic()) - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        line = f"[PROGRESS] {self.label} {self.done}"
+        if self.total:
+            line += f"/{self.total} ({100 * self.done / self.total:.1f}%)"
+        line += f" {rate:.1f}/s"
+        if self.total and rate > 0:
+            remaining = max(self.total - self.done, 0) / rate
+            hours, rest = divmod(int(remaining), 3600)
+            line += f" ETA {hours}:{rest // 60:02}:{rest % 60:02}"
+        self.logger.info(line)
+
+    def close(self):
+        self.report()
@@ -0,0 +1,108 @@
+"""
+    Counters, stage timers and optional tracemalloc snapshots for pipeline scripts.
+    A run ends with export(), which writes
+        logs/metrics/<script>.json  - summary for humans and diffing between runs
+        logs/metrics/<script>.prom  - Prometheus textfile collector format
+"""
+import json
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()  # read at import, some scripts import this before loading .env themselves
+
+METRICS_DIR = Path(os.getenv("METRICS_DIR", "logs/metrics"))
+TRACE_MEMORY = os.getenv("TRACE_MEMORY", "false").lower() == "true"
+
+
+class Metrics:
+    def __init__(self, script: str, trace_memory: bool = TRACE_MEMORY):
+        self.script = script
+        self.started = time.time()
+        self.counters = defaultdict(int)
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.memory = {}
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[name] += time.perf_counter() - start
+            self.stage_calls[name] += 1
+
+    def snapshot_memory(self, label: str):
+        """Record current and peak traced memory, no-op unless TRACE_MEMORY is on."""
+        if not self.trace_memory:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        self.memory[label] = {"current_bytes": current, "peak_bytes": peak}
+
+    def summary(self) -> dict:
+        return {
+            "script": self.script,
+            "started": self.started,
+            "wall_seconds": round(time.time() - self.started, 3),
+            "stages": {
+                name: {"seconds": round(seconds, 6), "calls": self.stage_calls[name]}
+                for name, seconds in sorted(self.stage_seconds.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "memory": self.memory,
+        }
+
+    def to_prometheus(self) -> str:
+        summary = self.summary()
+        label = f'script="{self.script}"'
+        lines = [
+            "# TYPE ocr_pipeline_wall_seconds gauge",
+            f"ocr_pipeline_wall_seconds{{{label}}} {summary['wall_seconds']}",
+            "# TYPE ocr_pipeline_stage_seconds_total counter",
+        ]
+        lines += [
+            f'ocr_pipeline_stage_seconds_total{{{label},stage="{name}"}} {stage["seconds"]}'
+            for name, stage in summary["stages"].items()
+        ]
+        lines.append("# TYPE ocr_pipeline_stage_calls_total counter")
+        lines += [
+            f'ocr_pipeline_stage_calls_total{{{label},stage="{name}"}} {stage["calls"]}'
+            for name, stage in summary["stages"].items()
+        ]
+        lines.append("# TYPE ocr_pipeline_events_total counter")
+        lines += [
+            f'ocr_pipeline_events_total{{{label},event="{name}"}} {value}'
+            for name, value in summary["counters"].items()
+        ]
+        if self.memory:
+            lines.append("# TYPE ocr_pipeline_peak_memory_bytes gauge")
+            lines += [
+                f'ocr_pipeline_peak_memory_bytes{{{label},snapshot="{name}"}} {snap["peak_bytes"]}'
+                for name, snap in self.memory.items()
+            ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, out_dir: Path = METRICS_DIR):
+        self.snapshot_memory("end")
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        json_path = out_dir / f"{self.script}.json"
+        prom_path = out_dir / f"{self.script}.prom"
+        with json_path.open("w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        # Write then rename, the textfile collector must never see a half-written file
+        tmp_path = prom_path.with_suffix(".prom.tmp")
+        tmp_path.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp_path, prom_path)
+        print(f"[METRICS] Saved {json_path} and {prom_path}")
@@ -0,0 +1,166 @@
+"""
+    Transparent compressed storage for extracted and corrected texts.
+    Callers keep using the logical name ("book.pdf.txt"); on disk the file
+    is "book.pdf.txt", "book.pdf.txt.gz" or "book.pdf.txt.zst". Reads pick
+    whichever exists, writes use TEXT_COMPRESSION and are atomic (temp file
+    in the same directory, then os.replace). Sidecars stay uncompressed.
+"""
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always there
+    zstandard = None
+
+from dotenv import load_dotenv
+load_dotenv()  # imported by extractor modules before the scripts load .env themselves
+
+TEXT_COMPRESSION = os.getenv("TEXT_COMPRESSION", "none").lower()  # none | gzip | zstd
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+
+if TEXT_COMPRESSION not in SUFFIXES:
+    raise ValueError(f"TEXT_COMPRESSION must be one of {', '.join(SUFFIXES)}, got {TEXT_COMPRESSION!r}")
+if TEXT_COMPRESSION == "zstd" and zstandard is None:
+    print("[WARN] TEXT_COMPRESSION=zstd but the zstandard package is not installed, using gzip")
+    TEXT_COMPRESSION = "gzip"
+
+
+def logical_path(path: Path) -> Path:
+    """"book.pdf.txt.gz" → "book.pdf.txt"; plain paths are returned unchanged."""
+    path = Path(path)
+    return path.with_suffix("") if path.suffix in COMPRESSED_SUFFIXES else path
+
+
+def variants(path: Path) -> list[Path]:
+    path = logical_path(path)
+    return [path.with_name(path.name + suffix) for suffix in SUFFIXES.values()]
+
+
+def stored_path(path: Path) -> Path:
+    """The file on disk for a logical path, the plain path if none exists yet."""
+    for candidate in variants(path):
+        if candidate.exists():
+            return candidate
+    return logical_path(path)
+
+
+def exists(path: Path) -> bool:
+    return any(candidate.exists() for candidate in variants(path))
+
+
+def remove(path: Path):
+    for candidate in variants(path):
+        candidate.unlink(missing_ok=True)
+
+
+def open_text(path: Path, mode: str = "r", encoding: str = "utf-8", errors: str | None = None):
+    """Open a stored text for reading, "r" for lines/str or "rb" for bytes (seekable, gzip emulates it)."""
+    path = stored_path(path)
+    binary = "b" in mode
+    if path.suffix == ".gz":
+        f = gzip.open(path, "rb")
+    elif path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path} needs the zstandard package")
+        f = zstandard.open(path, "rb")
+    else:
+        return open(path, "rb") if binary else open(path, "r", encoding=encoding, errors=errors)
+    return f if binary else io.TextIOWrapper(f, encoding=encoding, errors=errors)
+
+
+def iter_lines(path: Path, errors: str | None = "ignore"):
+    """Stream the lines of a stored text, whatever its compression."""
+    with open_text(path, "r", errors=errors) as f:
+        yield from f
+
+
+def read_text(path: Path, errors: str | None = None) -> str:
+    with open_text(path, "r", errors=errors) as f:
+        return f.read()
+
+
+def _compressed_writer(raw, compression: str):
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=GZIP_LEVEL)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=False)
+    return None
+
+
+@contextmanager
+def atomic_write(path: Path, mode: str = "w", encoding: str = "utf-8", compression: str | None = None):
+    """
+    Write a logical path atomically with the configured compression ("w" text or "wb" bytes).
+    Other stored variants of the same logical path are removed once the new file is in place.
+    """
+    compression = compression or TEXT_COMPRESSION
+    path = logical_path(path)
+    target = path.with_name(path.name + SUFFIXES[compression])
+    target.parent.mkdir(parents=True, exist_ok=True)
+    raw = tempfile.NamedTemporaryFile("wb", dir=target.parent, prefix=f".{target.name}.", suffix=".part", delete=False)
+    tmp_path = Path(raw.name)
+    try:
+        with raw:
+            writer = _compressed_writer(raw, compression)
+            stream = writer if writer is not None else raw
+            f = stream if "b" in mode else io.TextIOWrapper(stream, encoding=encoding, write_through=True)
+            yield f
+            f.flush()
+            if f is not stream:
+                f.detach()  # so the wrapper never closes the stream behind our back
+            if writer is not None:
+                writer.close()  # writes the compressed trailer, raw stays open
+        os.replace(tmp_path, target)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    for other in variants(path):
+        if other != target:
+            other.unlink(missing_ok=True)
+
+
+def write_text(path: Path, text: str, encoding: str = "utf-8"):
+    with atomic_write(path, "w", encoding=encoding) as f:
+        f.write(text)
+
+
+def install_file(plain_path: Path, path: Path):
+    """Move a finished uncompressed temp file into place as the logical path, compressing it if configured."""
+    if TEXT_COMPRESSION == "none":
+        os.replace(plain_path, path)
+        for other in variants(path)[1:]:
+            other.unlink(missing_ok=True)
+        return
+    with open(plain_path, "rb") as src, atomic_write(path, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    Path(plain_path).unlink()
+
+
+def copy_text(src: Path, dst: Path):
+    """Copy a stored text keeping its compression."""
+    stored = stored_path(src)
+    dst = logical_path(dst)
+    for other in variants(dst):
+        other.unlink(missing_ok=True)
+    shutil.copyfile(stored, dst.with_name(dst.name + stored.name[len(logical_path(stored).name):]))
+
+
+def iter_text_files(root: Path, pattern: str = "*.txt"):
+    """Logical paths of all stored texts below root, plain or compressed, each once."""
+    seen = set()
+    for suffix in SUFFIXES.values():
+        for path in Path(root).rglob(pattern + suffix):
+            logical = logical_path(path)
+            if logical not in seen:
+                seen.add(logical)
+                yield logical
@@ -7,12 +7,18 @@ import json
 import os
 import re
 from pathlib import Path
+from common.log import Progress, setup_logging
+from common.metrics import Metrics
+from common.textio import atomic_write, iter_text_files, read_text
 
 OCR_DIR = os.getenv("MEDIA") / "ocrd/"
 OUTPUT_DIR = "logs/corrected_texts"
 CORRECTIONS_FILE = "logs/ocr_corrections.json"
 WHITELIST_FILE = "logs/whitelist.txt"
 
+log = setup_logging("apply_corrections")
+metrics = Metrics("apply_corrections")
+
 def load_corrections(path):
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -28,7 +34,10 @@ def correct_text(text, corrections, whitelist):
         lower_word = word.lower()
         if lower_word in whitelist:
             return word  # leave it
-        return corrections.get(lower_word, word)
+        corrected = corrections.get(lower_word, word)
+        if corrected != word:
+            metrics.count("replacements")
+        return corrected
     return re.sub(r"\b[a-zA-Z’'-]{3,}\b", replace_word, text)
 
 def process_files(input_dir, output_dir, corrections, whitelist):
@@ -36,19 +45,27 @@ def process_files(input_dir, output_dir, corrections, whitelist):
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    for txt_file in input_dir.rglob("*.txt"):
-        with open(txt_file, "r", encoding="utf-8", errors="ignore") as f:
-            original_text = f.read()
-        corrected_text = correct_text(original_text, corrections, whitelist)
+    txt_files = list(iter_text_files(input_dir))
+    progress = Progress(log, "apply_corrections", total=len(txt_files))
+    for txt_file in txt_files:
+        with metrics.stage("read"):
+            original_text = read_text(txt_file, errors="ignore")
+        with metrics.stage("rule_engine"):
+            corrected_text = correct_text(original_text, corrections, whitelist)
         output_path = output_dir / txt_file.relative_to(input_dir)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "w", encoding="utf-8") as f:
+        with metrics.stage("write"), atomic_write(output_path) as f:  # compressed if TEXT_COMPRESSION is set
             f.write(corrected_text)
-        print(f"[DONE] Corrected: {output_path}")
+        metrics.count("files")
+        metrics.count("chars", len(original_text))
+        log.debug("[DONE] Corrected", extra={"fields": {"file": str(output_path)}})
+        progress.update()
+    progress.close()
 
 # Load everything
-corrections = load_corrections(CORRECTIONS_FILE)
-whitelist = load_whitelist(WHITELIST_FILE)
+with metrics.stage("report_io"):
+    corrections = load_corrections(CORRECTIONS_FILE)
+    whitelist = load_whitelist(WHITELIST_FILE)
 
 # Apply to OCR text files
-process_files(OCR_DIR, OUTPUT_DIR, corrections, whitelist)
\ No newline at end of file
+process_files(OCR_DIR, OUTPUT_DIR, corrections, whitelist)
+metrics.export()
\ No newline at end of file
@@ -15,6 +15,7 @@ from pathlib import Path
 from rapidfuzz import fuzz
 from transformers import AutoModelForMaskedLM, AutoTokenizer
 import torch
+from common.metrics import Metrics
 
 # ========== Config ==========
 REJECTION_FILE = Path("logs") / "ocr_bert_rejection_report.txt"
@@ -23,16 +24,20 @@ REVIEW_FILE = Path("logs") / "bert_manual_review.txt"
 SIMILARITY_THRESHOLD = 85  # Lexical similarity
 LM_SCORE_THRESHOLD = 3.0   # log-prob gain needed to accept correction
 
+metrics = Metrics("bert_normalization_map")
+
 # ========== Load BERT ==========
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased")
-model = AutoModelForMaskedLM.from_pretrained("bert-base-uncased").to(device)
-model.eval()
+with metrics.stage("model_load"):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased")
+    model = AutoModelForMaskedLM.from_pretrained("bert-base-uncased").to(device)
+    model.eval()
 
 def score_sentence(text: str) -> float:
     # Compute average token log-probability using masked LM
-    inputs = tokenizer(text, return_tensors="pt").to(device)
-    with torch.no_grad():
+    with metrics.stage("tokenization"):
+        inputs = tokenizer(text, return_tensors="pt").to(device)
+    with metrics.stage("model_inference"), torch.no_grad():
         outputs = model(**inputs, labels=inputs["input_ids"])
         loss = outputs.loss
     return -loss.item() * len(inputs["input_ids"][0])  # pseudo log-prob
@@ -47,6 +52,7 @@ with REJECTION_FILE.open("r", encoding="utf-8") as f:
     for line in f:
         if not line.startswith("[BERT REJECT]"):
             continue
+        metrics.count("rejections_read")
         try:
             # if word.isdigit() or re.match(r"^\d+[a-z]?$", word.lower()):
             #     continue  # Skip BERT check
@@ -55,6 +61,7 @@ with REJECTION_FILE.open("r", encoding="utf-8") as f:
             context = line.split("in: ", 1)[1].strip()
             # === Skip numeric-like tokens ===
             if is_mostly_digits(wrong):
+                metrics.count("skipped_numeric")
                 continue
             # Lexical similarity
             sim = fuzz.ratio(wrong, suggestion)
@@ -69,6 +76,7 @@ with REJECTION_FILE.open("r", encoding="utf-8") as f:
             if sim >= SIMILARITY_THRESHOLD or gain >= LM_SCORE_THRESHOLD:
                 pattern = rf"\\b{re.escape(wrong)}\\b"
                 accepted[pattern] = suggestion
+                metrics.count("accepted")
             else:
                 manual_review.append({
                     "word": wrong,
@@ -77,19 +85,23 @@ with REJECTION_FILE.open("r", encoding="utf-8") as f:
                     "similarity": sim,
                     "gain": round(gain, 2)
                 })
+                metrics.count("manual_review")
 
         except Exception as e:
             print(f"[ERROR] Failed to parse or score: {line.strip()} - {e}")
+            metrics.count("errors")
 
 # ========== Save accepted corrections ==========
-with NORMALIZATION_PATCH.open("w", encoding="utf-8") as f:
-    json.dump({"ocr_artifacts": accepted}, f, indent=2, ensure_ascii=False)
+with metrics.stage("report_io"):
+    with NORMALIZATION_PATCH.open("w", encoding="utf-8") as f:
+        json.dump({"ocr_artifacts": accepted}, f, indent=2, ensure_ascii=False)
 
-# ========== Save manual review file ==========
-with REVIEW_FILE.open("w", encoding="utf-8") as f:
-    for entry in manual_review:
-        f.write(f"[UNCERTAIN] '{entry['word']}' → '{entry['suggestion']}' "
-                f"(sim={entry['similarity']}, gain={entry['gain']}) in: {entry['context']}\n")
+    # ========== Save manual review file ==========
+    with REVIEW_FILE.open("w", encoding="utf-8") as f:
+        for entry in manual_review:
+            f.write(f"[UNCERTAIN] '{entry['word']}' → '{entry['suggestion']}' "
+                    f"(sim={entry['similarity']}, gain={entry['gain']}) in: {entry['context']}\n")
 
 print(f"[OK] Auto-accepted: {len(accepted)} corrections → {NORMALIZATION_PATCH}")
-print(f"[REVIEW] Remaining: {len(manual_review)} lines → {REVIEW_FILE}")
\ No newline at end of file
+print(f"[REVIEW] Remaining: {len(manual_review)} lines → {REVIEW_FILE}")
+metrics.export()
@@ -0,0 +1,69 @@
+"""
+    Dehyphenation pre-pass for OCR text.
+    Rejoins words split by line-end hyphenation ("discov-\\nery")
+    and stray hyphen-space sequences ("sub- sequent") when the
+    joined form is a known word. Line count is preserved, so line
+    numbers in correction reports still point at the source file.
+"""
+import re
+
+# "discov-" at the end of a line followed by "ery" at the start of the next one
+LINE_END_HYPHEN = re.compile(r"([A-Za-z]+)-[ \t]*(\r?\n)([ \t]*)([a-z]+)([.,;:!?)\"']*)(?=\s|$)")
+# "sub- sequent" inside a single line
+HYPHEN_SPACE = re.compile(r"\b([A-Za-z]+)- +([a-z]+)\b")
+# leading spaces of a continuation line, any kind except line breaks
+LEADING_SPACE = re.compile(r"^[^\S\r\n]+")
+
+
+def _join(head: str, tail: str, is_known) -> str | None:
+    """Return the rejoined word, or None if the split should be left alone."""
+    joined = head + tail
+    if is_known(joined.lower()):
+        return joined
+    # Real compounds broken at the hyphen ("well-\nknown") keep the hyphen
+    if is_known(head.lower()) and is_known(tail.lower()):
+        return f"{head}-{tail}"
+    return None
+
+
+def _join_hyphen_space(line: str, is_known) -> str:
+    def replace(match):
+        head, tail = match.groups()
+        if is_known((head + tail).lower()):
+            return head + tail
+        return match.group(0)
+    return HYPHEN_SPACE.sub(replace, line)
+
+
+def dehyphenate_lines(lines, is_known):
+    """
+    Yield lines with hyphen-split words rejoined.
+    is_known(word) is called with lowercase candidates and decides which joins are accepted.
+    The completed word is moved to the upper line, so the number of lines never changes.
+    """
+    def replace_line_end(match):
+        head, newline, indent, tail, trail = match.groups()
+        word = _join(head, tail, is_known)
+        if word is None:
+            return match.group(0)
+        return f"{word}{trail}{newline}{indent}"
+
+    pending = None
+    for line in lines:
+        if pending is not None:
+            if pending.rstrip().endswith("-"):
+                # Indented continuations (tabs, no-break spaces) join without their indent
+                continuation = LEADING_SPACE.sub("", line)
+                merged = LINE_END_HYPHEN.sub(replace_line_end, pending + continuation, count=1)
+                if merged != pending + continuation:
+                    split_at = merged.index("\n") + 1
+                    pending, line = merged[:split_at], merged[split_at:]
+            yield _join_hyphen_space(pending, is_known)
+        pending = line
+    if pending is not None:
+        yield _join_hyphen_space(pending, is_known)
+
+
+def dehyphenate(text: str, is_known) -> str:
+    """Dehyphenate a whole text blob, see dehyphenate_lines."""
+    return "".join(dehyphenate_lines(text.splitlines(keepends=True), is_known))
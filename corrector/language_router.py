@@ -0,0 +1,89 @@
+"""
+    Per-language dictionaries and BERT verifiers for ocr_corrections.py.
+    Languages are configured in db/languages.json, e.g.
+        {
+            "eng": {"dictionary": "db/ocr_dictionary_symspell_merged.txt", "verifier": "bert-base-uncased"},
+            "rus": {"dictionary": "db/frequency_dictionary_ru.txt", "verifier": "DeepPavlov/rubert-base-cased"}
+        }
+    SymSpell indexes and models are loaded on first use and kept in small LRUs,
+    so a multilingual corpus never holds every dictionary in memory at once.
+"""
+import json
+from collections import OrderedDict
+from pathlib import Path
+from symspellpy import SymSpell
+from transformers import AutoModelForMaskedLM, AutoTokenizer
+
+
+def load_language_config(path: Path, defaults: dict) -> dict:
+    """Read db/languages.json on top of the built-in defaults."""
+    languages = {lang: dict(conf) for lang, conf in defaults.items()}
+    if Path(path).exists():
+        with open(path, "r", encoding="utf-8") as f:
+            for lang, conf in json.load(f).items():
+                languages.setdefault(lang, {}).update(conf)
+        print(f"[LANG] Loaded language config from {path}: {', '.join(sorted(languages))}")
+    return languages
+
+
+class SymSpellLRU:
+    """
+    Loaded SymSpell instances keyed by dictionary path.
+    Bounded by the total number of dictionary words held, the least
+    recently used dictionary is dropped first; the newest is always kept.
+    """
+    def __init__(self, max_words: int, max_edit_distance: int, prefix_length: int = 7):
+        self.max_words = max_words
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self._items = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, dict_path) -> SymSpell:
+        key = str(dict_path)
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+        self.misses += 1
+
+        sym_spell = SymSpell(max_dictionary_edit_distance=self.max_edit_distance, prefix_length=self.prefix_length)
+        if not sym_spell.load_dictionary(key, term_index=0, count_index=1):
+            raise RuntimeError(f"Failed to load dictionary from {key}")
+        print(f"[LANG] Loaded dictionary {key}: {len(sym_spell._words)} words")
+        self._items[key] = sym_spell
+
+        while len(self._items) > 1 and self.loaded_words() > self.max_words:
+            evicted, _ = self._items.popitem(last=False)
+            print(f"[LANG] Evicted dictionary {evicted}")
+        return sym_spell
+
+    def loaded_words(self) -> int:
+        return sum(len(s._words) for s in self._items.values())
+
+
+class VerifierLRU:
+    """Masked LM verifiers (tokenizer, model) keyed by model name, at most max_models loaded."""
+    def __init__(self, device, max_models: int = 1):
+        self.device = device
+        self.max_models = max_models
+        self._items = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, model_name: str):
+        if model_name in self._items:
+            self._items.move_to_end(model_name)
+            self.hits += 1
+            return self._items[model_name]
+        self.misses += 1
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForMaskedLM.from_pretrained(model_name).to(self.device)
+        model.eval()
+        print(f"[LANG] Loaded verifier {model_name}")
+        self._items[model_name] = (tokenizer, model)
+
+        while len(self._items) > self.max_models:
+            evicted, _ = self._items.popitem(last=False)
+            print(f"[LANG] Evicted verifier {evicted}")
+        return tokenizer, model
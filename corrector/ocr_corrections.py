@@ -10,11 +10,16 @@ import json
 import torch
 from pathlib import Path
 from rapidfuzz import fuzz
-from symspellpy import SymSpell, Verbosity
-from transformers import  AutoModelForMaskedLM, AutoTokenizer
+from symspellpy import Verbosity
 from dotenv import load_dotenv
 load_dotenv()
+from common.language import detect_language_from_filename
+from common.log import Progress, setup_logging
+from common.metrics import Metrics
+from common.textio import iter_text_files, open_text
 from merge_symspell import convert_to_symspell_format, merge_dictionaries, validate_symspell_dictionary
+from dehyphenate import dehyphenate_lines
+from language_router import SymSpellLRU, VerifierLRU, load_language_config
 
 # ========== Configuration ==========
 OUT_DB = Path("db")
@@ -25,6 +30,7 @@ DICT = OUT_DB / "dictionary_wordlist.txt"
 
 FREQ_DICT =  OUT_DB / "frequency_dictionary_en_82_765.txt" # add specialize dictionary here
 MAX_EDIT_DISTANCE = 2   # Use the SymSpell or Levenshtein distance - 2 or 3 - good default for OCR correction
+DEHYPHENATE = os.getenv("DEHYPHENATE", "true").lower() == "true" # rejoin "discov-\nery" before spellchecking
 
 DICT_SYM = DICT.with_suffix(".symspell.txt")
 SYM_DICT_OUT = OUT_DB / "ocr_dictionary_symspell_merged.txt"
@@ -33,11 +39,20 @@ OUTPUT_JSON = OUT_LOGS / "ocr_corrections.json"
 OUTPUT_TXT = OUT_LOGS / "ocr_suggestions_report.txt"
 OUTPUT_BERT = OUT_LOGS / "ocr_rejection_report.txt"
 
+# ========== Languages ==========
+LANGUAGES_FILE = OUT_DB / "languages.json" # per-language dictionary + verifier, see language_router.py
+DEFAULT_LANGUAGE = "eng"
+SKIP_UNCONFIGURED_LANGUAGES = os.getenv("SKIP_UNCONFIGURED_LANGUAGES", "true").lower() == "true"
+SYMSPELL_CACHE_WORDS = int(os.getenv("SYMSPELL_CACHE_WORDS", "3000000")) # total words kept in loaded dictionaries
+VERIFIER_CACHE_SIZE = int(os.getenv("VERIFIER_CACHE_SIZE", "1")) # BERT models kept in memory
+WORD_PATTERN = r"\b[a-zA-Z0-9’'-]{3,}\b"
+UNICODE_WORD_PATTERN = r"\b[\w’'-]{3,}\b" # default for non-English languages
+
+log = setup_logging("ocr_corrections")
+metrics = Metrics("ocr_corrections")
+
 # ========== BERT masked language model ==========
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased")
-model = AutoModelForMaskedLM.from_pretrained("bert-base-uncased").to(device)
-model.eval()
 
 # ========== Normalization Maps ==========
 LIGATURES = {"ﬁ": "fi", "ﬂ": "fl", "ﬀ": "ff", "ﬃ": "ffi", "ﬄ": "ffl"}
@@ -54,9 +69,10 @@ REGEX_FIXES = {
 }
 
 # ========== Load and Merge Dictionaries ==========
-convert_to_symspell_format(DICT, DICT_SYM)
-merge_dictionaries(FREQ_DICT, DICT_SYM, SYM_DICT_OUT)
-validate_symspell_dictionary(SYM_DICT_OUT)
+with metrics.stage("dictionary_merge"):
+    convert_to_symspell_format(DICT, DICT_SYM)
+    merge_dictionaries(FREQ_DICT, DICT_SYM, SYM_DICT_OUT)
+    validate_symspell_dictionary(SYM_DICT_OUT)
 
 
 # ========== Helper Functions ==========
@@ -65,8 +81,8 @@ def normalize(text):
         text = text.replace(src, tgt)
     return text
 
-def extract_words(text):
-    return re.findall(r"\b[a-zA-Z0-9’'-]{3,}\b", text)
+def extract_words(text, pattern=WORD_PATTERN):
+    return re.findall(pattern, text)
 
 def load_whitelist(path):
     if not Path(path).exists():
@@ -132,12 +148,22 @@ def is_bert_semantically_compatible_offset(
 
     return suggestion.lower() in [t.lower() for t in predicted_tokens]
 
-# Step 3: Load merged dictionary into SymSpell
-sym_spell = SymSpell(max_dictionary_edit_distance=MAX_EDIT_DISTANCE, prefix_length=7)
-if not sym_spell.load_dictionary(SYM_DICT_OUT, term_index=0, count_index=1):
-    raise RuntimeError(f"Failed to load dictionary from {SYM_DICT_OUT}")
-else:
-    print(f"Loaded merged dictionary: {len(sym_spell._words)} words")
+# Step 3: Route languages to dictionaries, merged English dictionary is the default
+languages = load_language_config(LANGUAGES_FILE, {
+    DEFAULT_LANGUAGE: {"dictionary": str(SYM_DICT_OUT), "verifier": "bert-base-uncased"},
+})
+sym_spells = SymSpellLRU(SYMSPELL_CACHE_WORDS, MAX_EDIT_DISTANCE)
+verifiers = VerifierLRU(device, VERIFIER_CACHE_SIZE)
+
+def resolve_language(file_path):
+    """Return (lang, config) for a text file, or (lang, None) if it has no dictionary and should be skipped."""
+    lang = detect_language_from_filename(file_path)
+    config = languages.get(lang)
+    if config is None or not Path(config.get("dictionary", "")).exists():
+        if SKIP_UNCONFIGURED_LANGUAGES:
+            return lang, None
+        return DEFAULT_LANGUAGE, languages[DEFAULT_LANGUAGE]
+    return lang, config
 
 
 # ========== Process Text Files ==========
@@ -146,41 +172,77 @@ bert_rejections = []
 corrections = {}
 lines_with_corrections = []
 
-for file_path in DST_DIR.rglob("*.txt"):
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        for line_num, raw_line in enumerate(f, start=1):
+def normalized_lines(f):
+    for raw_line in f:
+        with metrics.stage("normalization"):
             line = normalize(raw_line)
+        yield line
+
+text_files = list(iter_text_files(DST_DIR))
+progress = Progress(log, "ocr_corrections", total=len(text_files))
+for file_path in text_files:
+    progress.update()
+    lang, lang_config = resolve_language(file_path)
+    if lang_config is None:
+        log.debug("[SKIP] No dictionary configured", extra={"fields": {"lang": lang, "file": str(file_path)}})
+        metrics.count("files_skipped_language")
+        continue
+    with metrics.stage("dictionary_load"):
+        sym_spell = sym_spells.get(lang_config["dictionary"])
+    with metrics.stage("model_load"):
+        tokenizer, model = verifiers.get(lang_config.get("verifier", "bert-base-uncased"))
+    word_pattern = lang_config.get("word_pattern", WORD_PATTERN if lang == DEFAULT_LANGUAGE else UNICODE_WORD_PATTERN)
+    metrics.count("files")
+
+    def is_known_word(word):
+        return word in whitelist or sym_spell._words.get(word, 0) > 0
+
+    with open_text(file_path, "r", errors="ignore") as f:
+        # Rejoin split words first, so their halves never reach SymSpell and BERT
+        lines = normalized_lines(f)
+        if DEHYPHENATE:
+            lines = dehyphenate_lines(lines, is_known_word)
+        for line_num, line in enumerate(lines, start=1):
+            metrics.count("lines")
 
             # Apply regex artifact rules
-            for pattern, replacement in REGEX_FIXES.items():
-                if re.search(pattern, line):
-                    fixed = re.sub(pattern, replacement, line)
-                    lines_with_corrections.append({
-                        "file": str(file_path),
-                        "line": line_num,
-                        "original": line.strip(),
-                        "suggested": fixed.strip()
-                    })
-                    corrections[pattern] = replacement
+            with metrics.stage("rule_engine"):
+                for pattern, replacement in REGEX_FIXES.items():
+                    if re.search(pattern, line):
+                        fixed = re.sub(pattern, replacement, line)
+                        lines_with_corrections.append({
+                            "file": str(file_path),
+                            "line": line_num,
+                            "original": line.strip(),
+                            "suggested": fixed.strip()
+                        })
+                        corrections[pattern] = replacement
+                        metrics.count("rule_matches")
 
             # Spellcheck individual words
-            words = set(extract_words(line.lower()))
+            with metrics.stage("tokenization"):
+                words = set(extract_words(line.lower(), word_pattern))
+            metrics.count("tokens_examined", len(words))
             for word in words:
-                if word in whitelist or sym_spell._words.get(word, 0) > 0:
+                if is_known_word(word):
+                    metrics.count("tokens_known")
                     continue
                 
-                suggestions = sym_spell.lookup(word, Verbosity.TOP, max_edit_distance=MAX_EDIT_DISTANCE)
+                with metrics.stage("symspell_lookup"):
+                    suggestions = sym_spell.lookup(word, Verbosity.TOP, max_edit_distance=MAX_EDIT_DISTANCE)
                 if suggestions:
                     best = suggestions[0]
                     if best.term != word:
-                        context_ok = is_bert_semantically_compatible_offset(
-                            original_line=line,
-                            target_word=word,
-                            suggestion=best.term,
-                            tokenizer=tokenizer,
-                            model=model,
-                            device=device
-                        )
+                        metrics.count("candidates")
+                        with metrics.stage("model_inference"):
+                            context_ok = is_bert_semantically_compatible_offset(
+                                original_line=line,
+                                target_word=word,
+                                suggestion=best.term,
+                                tokenizer=tokenizer,
+                                model=model,
+                                device=device
+                            )
                         if context_ok:
                             lines_with_corrections.append({
                                 "file": str(file_path),
@@ -189,31 +251,47 @@ for file_path in DST_DIR.rglob("*.txt"):
                                 "suggested": best.term
                             })
                             corrections[word] = best.term
+                            metrics.count("accepted")
+                            log.debug("[BERT ACCEPT]", extra={"fields": {
+                                "file": str(file_path), "line": line_num, "word": word, "suggested": best.term}})
                         else:
                             bert_rejections.append({
                                 "word": word,
                                 "suggested": best.term,
                                 "context": line.strip()
                             })
-                        print(f"[BERT REJECT] '{word}' → '{best.term}' in: {line.strip()}")
+                            metrics.count("rejected")
+                            log.debug("[BERT REJECT]", extra={"fields": {
+                                "file": str(file_path), "line": line_num, "word": word, "suggested": best.term}})
+                else:
+                    metrics.count("no_suggestion")
+    metrics.snapshot_memory("after_file")  # peak so far, one label keeps the export small
 
 # ========== Output Results ==========
-with open(OUTPUT_JSON, "w", encoding="utf-8") as f: # Save JSON report
-    json.dump({
-        "corrections": corrections,
-        "lines": lines_with_corrections
-    }, f, indent=2, ensure_ascii=False)
-
-with open(OUTPUT_TXT, "w", encoding="utf-8") as f: # Save text report
-    for entry in lines_with_corrections:
-        f.write(f"[{entry['file']}:{entry['line']}] '{entry['original']}' → '{entry['suggested']}'\n")
-
-with open(OUTPUT_BERT, "w", encoding="utf-8") as f: # Save text report
-    for entry in bert_rejections:
-        f.write(f"[BERT REJECT] '{entry['word']}' → '{entry['suggested']}' in: {entry['context']}\n")
-
-print(f"[DONE] Corrections saved to {OUTPUT_JSON} and {OUTPUT_TXT}")
-print(f"[DONE] BERT rejections saved to {OUTPUT_BERT}")
+with metrics.stage("report_io"):
+    with open(OUTPUT_JSON, "w", encoding="utf-8") as f: # Save JSON report
+        json.dump({
+            "corrections": corrections,
+            "lines": lines_with_corrections
+        }, f, indent=2, ensure_ascii=False)
+
+    with open(OUTPUT_TXT, "w", encoding="utf-8") as f: # Save text report
+        for entry in lines_with_corrections:
+            f.write(f"[{entry['file']}:{entry['line']}] '{entry['original']}' → '{entry['suggested']}'\n")
+
+    with open(OUTPUT_BERT, "w", encoding="utf-8") as f: # Save text report
+        for entry in bert_rejections:
+            f.write(f"[BERT REJECT] '{entry['word']}' → '{entry['suggested']}' in: {entry['context']}\n")
+
+progress.close()
+log.info(f"[DONE] Corrections saved to {OUTPUT_JSON} and {OUTPUT_TXT}")
+log.info(f"[DONE] BERT rejections saved to {OUTPUT_BERT}")
+
+metrics.count("dictionary_cache_hits", sym_spells.hits)
+metrics.count("dictionary_cache_misses", sym_spells.misses)
+metrics.count("verifier_cache_hits", verifiers.hits)
+metrics.count("verifier_cache_misses", verifiers.misses)
+metrics.export()
 
 # Regex-based artifact replacement
 # Ligature/punctuation normalization
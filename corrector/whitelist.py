@@ -18,15 +18,15 @@ import re
 from collections import Counter
 from pathlib import Path
 from nltk.corpus import names
+from common.textio import iter_lines, iter_text_files
 nltk.download('names', quiet=True) # Download names corpus if not already available
 
 def build_whitelist_from_texts(base_dir, min_occurrences=2):
     word_counter = Counter()
-    for path in Path(base_dir).rglob("*.txt"):
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                words = re.findall(r"\b[a-zA-Z’'-]{3,}\b", line)
-                word_counter.update(w.lower() for w in words)
+    for path in iter_text_files(base_dir):  # plain or compressed, see common/textio.py
+        for line in iter_lines(path):
+            words = re.findall(r"\b[a-zA-Z’'-]{3,}\b", line)
+            word_counter.update(w.lower() for w in words)
     return {word for word, freq in word_counter.items() if freq >= min_occurrences}
 
 def load_dictionary_words(dict_path):
@@ -0,0 +1,159 @@
+"""
+    Content-addressed cache for heavy loader conversions (MOBI → EPUB,
+    CHM → extracted HTML tree, ...). Entries live in
+    <root>/<kind>/<source sha256>/ and are built in a temp dir next to it,
+    then renamed into place, so parallel extract workers never see half an
+    entry. Least recently used entries are evicted past max_bytes, except
+    ones being read (shared flock on the entry info) or used within
+    EVICT_GRACE seconds.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows, the grace period alone protects readers there
+    fcntl = None
+
+from dotenv import load_dotenv
+from extractor.manifest import file_sha256
+load_dotenv()  # read at import, before the calling script loads .env
+
+CONVERSION_CACHE = os.getenv("CONVERSION_CACHE", "logs/conversion_cache")  # empty disables the cache
+CONVERSION_CACHE_MAX_MB = int(os.getenv("CONVERSION_CACHE_MAX_MB", "5120"))
+
+ENTRY_INFO = ".entry.json"  # size and source of a finished entry, its mtime is the last use
+EVICT_GRACE = 15 * 60  # seconds; entries used this recently are kept, another worker may be about to read them
+
+
+def tree_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class ConversionCache:
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def entry_dir(self, kind: str, sha256: str) -> Path:
+        return self.root / kind / sha256
+
+    def get_or_build(self, kind: str, source: Path, build) -> Path:
+        """
+        Directory holding the converted artifacts of source; build(out_dir) fills
+        an empty directory and runs only on a miss.
+        """
+        entry = self.entry_dir(kind, file_sha256(source))
+        info = entry / ENTRY_INFO
+        if info.exists():
+            os.utime(info)  # mark as recently used
+            return entry
+
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        building = Path(tempfile.mkdtemp(dir=entry.parent, prefix=f".{entry.name}."))
+        try:
+            build(building)
+            with (building / ENTRY_INFO).open("w", encoding="utf-8") as f:
+                json.dump({"source": str(source), "size": tree_size(building), "built": time.time()}, f)
+            try:
+                os.rename(building, entry)
+            except OSError:
+                if not info.exists():  # not another worker winning the race
+                    raise
+        finally:
+            shutil.rmtree(building, ignore_errors=True)
+        return entry
+
+    @staticmethod
+    def lock_for_reading(entry: Path):
+        """
+        Open file holding a shared lock on the entry, evict() in other processes
+        leaves it alone until it is closed. FileNotFoundError if the entry was evicted first.
+        """
+        info = entry / ENTRY_INFO
+        f = info.open("rb")
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH)
+        if not info.exists():  # removed while we waited for the lock
+            f.close()
+            raise FileNotFoundError(info)
+        return f
+
+    def entries(self) -> list[tuple[float, int, Path]]:
+        """(last use, size, entry dir) of every finished entry."""
+        found = []
+        for info in self.root.glob(f"*/*/{ENTRY_INFO}"):
+            try:
+                with info.open(encoding="utf-8") as f:
+                    size = json.load(f)["size"]
+                found.append((info.stat().st_mtime, size, info.parent))
+            except (OSError, ValueError, KeyError):
+                continue  # removed or half written by another process
+        return found
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits; returns the number removed."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        recent = time.time() - EVICT_GRACE
+        removed = 0
+        for last_use, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if last_use > recent:
+                break  # sorted by last use, everything after is recent too
+            if self.remove_unless_read(entry):
+                total -= size
+                removed += 1
+        return removed
+
+    @staticmethod
+    def remove_unless_read(entry: Path) -> bool:
+        try:
+            f = (entry / ENTRY_INFO).open("rb")
+        except OSError:
+            return False  # already removed by another process
+        with f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False  # a loader is reading it right now
+            if os.fstat(f.fileno()).st_mtime > time.time() - EVICT_GRACE:
+                return False  # picked up by get_or_build since entries() was listed
+            shutil.rmtree(entry, ignore_errors=True)
+        return True
+
+
+def default_cache() -> ConversionCache | None:
+    return ConversionCache(Path(CONVERSION_CACHE), CONVERSION_CACHE_MAX_MB * 1024 * 1024) if CONVERSION_CACHE else None
+
+
+@contextmanager
+def converted(kind: str, source: Path, build):
+    """
+    Directory with the conversion of source: the cache entry, or with the cache
+    disabled a private temp dir that is removed afterwards.
+    """
+    cache = default_cache()
+    if cache is not None:
+        for attempt in range(2):
+            entry = cache.get_or_build(kind, Path(source), build)
+            try:
+                lock = cache.lock_for_reading(entry)
+            except FileNotFoundError:
+                continue  # evicted between lookup and lock, build it again
+            with lock:
+                yield entry
+            cache.evict()  # only once this entry is no longer needed
+            return
+        raise RuntimeError(f"Conversion cache entry for {source} keeps being evicted")
+    with tempfile.TemporaryDirectory(prefix=f"{kind}_") as tmpdir:
+        build(Path(tmpdir))
+        yield Path(tmpdir)
@@ -0,0 +1,94 @@
+"""
+    Single-pass directory indexes for OCR candidate discovery.
+    SRC_DIR is walked once with os.scandir and indexed by relative path,
+    file name and stem; DST_DIR is walked once and empty .txt files are
+    found from their size plus a bounded read, partly scanned ones from their OCR plan. Matching is then dict lookups.
+"""
+import os
+from collections import defaultdict
+from pathlib import Path
+
+from common.textio import COMPRESSED_SUFFIXES, logical_path, open_text
+
+EMPTY_PROBE_BYTES = 64 * 1024  # read at most this much to decide a .txt is blank
+
+
+def walk_files(root: Path):
+    """Yield (path, os.DirEntry) for every regular file below root, one scandir per directory."""
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        yield Path(entry.path), entry
+        except OSError as e:
+            print(f"[WARN] Cannot scan {e.filename}: {e.strerror}")
+
+
+def is_blank_text(path: Path, size: int, probe_bytes: int = EMPTY_PROBE_BYTES) -> bool:
+    """True for empty or whitespace-only files, usually after reading a single chunk; compressed files are read decompressed."""
+    if size == 0:
+        return True
+    with open_text(path, "rb") as f:
+        while chunk := f.read(probe_bytes):
+            if chunk.strip():
+                return False
+    return True
+
+
+def is_text_file(path: Path) -> bool:
+    """"book.pdf.txt" stored plain or compressed ("book.pdf.txt.gz")."""
+    return logical_path(path).suffix == ".txt" and (path.suffix == ".txt" or path.suffix in COMPRESSED_SUFFIXES)
+
+
+def find_blank_texts(dst_dir: Path) -> list[Path]:
+    """Logical paths ("book.pdf.txt") of blank texts, however they are stored."""
+    return sorted(
+        logical_path(path) for path, entry in walk_files(dst_dir)
+        if is_text_file(path) and is_blank_text(path, entry.stat().st_size)
+    )
+
+
+def find_ocr_texts(dst_dir: Path, plan_suffix: str = ".ocr_pages.json") -> list[Path]:
+    """Blank .txt files plus those with pages left to OCR ("book.pdf.ocr_pages.json" next to "book.pdf.txt")."""
+    texts, planned = [], set()
+    for path, entry in walk_files(dst_dir):
+        if path.name.endswith(plan_suffix):
+            planned.add(path.with_name(path.name[:-len(plan_suffix)] + ".txt"))
+        elif is_text_file(path):
+            texts.append((path, entry.stat().st_size))
+    return sorted(logical_path(path) for path, size in texts
+                  if logical_path(path) in planned or is_blank_text(path, size))
+
+
+class SourceIndex:
+    def __init__(self, src_dir: Path):
+        self.src_dir = Path(src_dir)
+        self.by_rel_path = {}
+        self.by_name = defaultdict(list)
+        self.by_stem = defaultdict(list)
+        for path, _ in walk_files(self.src_dir):
+            self.by_rel_path[path.relative_to(self.src_dir).as_posix()] = path
+            self.by_name[path.name].append(path)
+            self.by_stem[path.stem].append(path)
+        for paths in (*self.by_name.values(), *self.by_stem.values()):
+            paths.sort()
+
+    def __len__(self) -> int:
+        return len(self.by_rel_path)
+
+    def match(self, base_name: str, rel_parent: str = "") -> Path | None:
+        """
+        Find the source of an extracted text: same relative folder first,
+        then the same file name anywhere, then "<base_name>.*" anywhere.
+        """
+        rel_path = f"{rel_parent}/{base_name}" if rel_parent not in ("", ".") else base_name
+        if rel_path in self.by_rel_path:
+            return self.by_rel_path[rel_path]
+        for candidates in (self.by_name.get(base_name), self.by_stem.get(base_name)):
+            if candidates:
+                return candidates[0]
+        return None
@@ -1,133 +1,316 @@
+import json
 import os
-import re
+import shutil
 import sys
+import tempfile
 from pathlib import Path
 from datetime import datetime
 # python3 ocr/extractor/extract.py
-from extractor.loaders import detect_and_load_text
-from extractor.ocr import perform_ocr_workflow
+from extractor.headers import HeaderDetector, headers_path, write_stripped_headers
+from extractor.loaders import detect_and_lazy_load_text, get_loader
+from extractor.manifest import ExtractionManifest, file_sha256
+from extractor.page_index import PAGE_SEPARATOR, page_index_path, write_page_index
+from extractor.page_quality import file_quality, load_wordlist, ocr_plan_path, text_quality, write_ocr_plan
+from extractor.ocr import run_ocr_batch
+from extractor.worker_pool import run_inline, run_isolated
 from dotenv import load_dotenv
 load_dotenv()
+from common.language import language_tag_from_filename
+from common.log import Progress, setup_logging
+from common.textio import copy_text, install_file
+from common import textio
+
+log = setup_logging("extract")
 
 SRC_DIR = Path(os.getenv("SRC_DIR"))  # change this to your source folder
 DST_DIR = Path(os.getenv("DST_DIR"))  # change this to your output folder
 LOG_FILE = Path(os.getenv("LOG_FILE")) # full absolute path from .env
+STRIP_HEADERS = os.getenv("STRIP_HEADERS", "true").lower() == "true" # drop running heads/page numbers
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "1")) # >1 runs loaders in isolated worker processes
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "0")) or None # seconds per file, hung loaders are killed
+# Per-file status keyed by path relative to SRC_DIR, replaces the filename-only LOG_FILE list
+MANIFEST = Path(os.getenv("EXTRACT_MANIFEST", LOG_FILE.with_name("extract_manifest.sqlite")))
+QUALITY_THRESHOLD = float(os.getenv("QUALITY_THRESHOLD", "0.5")) # pages scoring below are queued for OCR
+QUALITY_DICTIONARY = os.getenv("QUALITY_DICTIONARY") # word list / SymSpell dictionary for the hit rate, optional
+QUALITY_LANGUAGE = os.getenv("QUALITY_LANGUAGE", "eng") # files whose name is tagged with this language are checked against it
+OCR_SOURCE_SUFFIXES = (".pdf", ".djvu") # text layers that ocr.py can replace page by page
 
 def assert_dirs_exist(*dirs):
     for d in dirs:
         if d is None:
-            print(f"[FATAL] Environment variable for a directory is missing.")
+            log.critical(f"[FATAL] Environment variable for a directory is missing.")
             sys.exit(1)
         if not d.exists() or not d.is_dir():
-            print(f"[FATAL] Directory does not exist: {d}")
+            log.critical(f"[FATAL] Directory does not exist: {d}")
             sys.exit(1)
             # 
 assert_dirs_exist(DST_DIR, SRC_DIR, LOG_FILE.parent)
 
-print("DST_DIR:", DST_DIR)
-print("SRC_DIR:", SRC_DIR)
-print("LOG_FILE:", LOG_FILE)
+log.info(f"DST_DIR: {DST_DIR}")
+log.info(f"SRC_DIR: {SRC_DIR}")
+log.info(f"MANIFEST: {MANIFEST}")
+
+# Loaded once before workers fork, shared copy-on-write
+QUALITY_WORDS = load_wordlist(QUALITY_DICTIONARY) if QUALITY_DICTIONARY else None
+
+def output_path_for(file_path: Path) -> Path:
+    # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") # uncomment if you need TIMESTAMP
+    target_dir = DST_DIR / file_path.relative_to(SRC_DIR).parent
+    new_filename = f"{file_path.name}.txt" # comment if you need TIMESTAMP and uncomment next line
+    # new_filename = f"{file_path.name}_{timestamp}.txt"  # book.pdf_20250524_153012.txt 
+    return target_dir / new_filename
 
-# Populate log file from existing .txt files in DST_DIR
-def initialize_log_from_existing_outputs():
-    if LOG_FILE.exists() and LOG_FILE.stat().st_size > 0:
-        print("[INIT] Log already exists. Skipping initialization.")
+# Populate manifest from existing .txt files in DST_DIR
+def initialize_manifest_from_existing_outputs(manifest: ExtractionManifest):
+    if len(manifest):
+        log.info(f"[INIT] Manifest has {len(manifest)} entries. Skipping initialization.")
         return
 
-    found = set()
-    for txt_file in DST_DIR.rglob("*.txt"):
-        stem = txt_file.stem  # filename without extension, e.g. "Origami"
-        # Remove timestamp suffix if present
-        match = re.match(r"^(.*\.\w+)_\d{8}_\d{6}$", txt_file.stem)
-        if match:
-            base_name = match.group(1)
-            found.add(base_name)
-        else:
-            print(f"[WARN] Could not parse filename from {txt_file.name}")
+    found = 0
+    for file_path in SRC_DIR.rglob("*"):
+        if not file_path.is_file():
+            continue
+        target_path = output_path_for(file_path)
+        if textio.exists(target_path):
+            # chars stays NULL: counting would mean reading every output
+            manifest.record(manifest.rel_path(file_path), file_path.stat(), "ok", output_path=str(target_path))
+            found += 1
 
     if found:
-        LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with LOG_FILE.open("w", encoding="utf-8") as log_f:
-            for entry in sorted(found):
-                log_f.write(f"{entry}\n")
-        print(f"[INIT] Populated log with {len(found)} existing extracted files.")
+        log.info(f"[INIT] Populated manifest with {found} existing extracted files.")
     else:
-        print("[INIT] No existing outputs found to initialize log.")
+        log.info("[INIT] No existing outputs found to initialize manifest.")
 
-# Read list of already processed files (without timestamp suffix)
-def get_already_processed():
-    if not LOG_FILE.exists():
-        return set()
-    with LOG_FILE.open("r", encoding="utf-8") as f:
-        lines = [line.strip() for line in f if line.strip()]
-        print(f"[DEBUG] Already processed files in log: {len(lines)}")
-        return set(lines)
+def write_pages(pages, out_file) -> list[tuple[int, int]]:
+    """Write page texts separated by blank lines, returns (byte offset, byte length) per page."""
+    spans = []
+    offset = 0
+    separator = PAGE_SEPARATOR.encode("utf-8")
+    for text in pages:
+        if spans:
+            out_file.write(separator)
+            offset += len(separator)
+        data = text.encode("utf-8")
+        out_file.write(data)
+        spans.append((offset, len(data)))
+        offset += len(data)
+    return spans
+
+def read_pages(path: Path, spans):
+    with open(path, "rb") as f:
+        for offset, length in spans:
+            f.seek(offset)
+            yield f.read(length).decode("utf-8")
+
+def extract_file(file_path: Path) -> dict:
+    """
+    Load one source file and write its text to DST_DIR. Runs inside worker processes.
+    Pages are streamed to a temp file next to the target and renamed into place, so
+    memory stays flat however large the document is. Running headers need a second
+    pass over that temp file, only their fuzzy keys are kept in between.
+    """
+    loader = get_loader(str(file_path))
+    if loader is None:
+        return {"status": "unsupported"}
+    loader_name = type(loader).__name__
+
+    target_path = output_path_for(file_path)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    detector = HeaderDetector() if STRIP_HEADERS else None
+    paged = True  # running headers only make sense for real pages, not unstructured elements
+    chars = 0
+    ocr_pages = []  # pages without a usable text layer, see extractor.page_quality
+    page_scores, page_weights = [], []
+    # Only files tagged with QUALITY_LANGUAGE: an untagged French book would miss every English word
+    words = QUALITY_WORDS if language_tag_from_filename(file_path) == QUALITY_LANGUAGE else None
+
+    def pages():
+        nonlocal paged, chars
+        for page_num, doc in enumerate(detect_and_lazy_load_text(str(file_path), loader=loader)):
+            paged = paged and "page" in doc.metadata
+            chars += len(doc.page_content)
+            score = text_quality(doc.page_content, words)
+            page_scores.append(score)
+            page_weights.append(len(doc.page_content))
+            if doc.metadata.get("text_layer") == "ocr" or (score is not None and score < QUALITY_THRESHOLD):
+                ocr_pages.append(page_num)
+            if detector is not None:
+                detector.add_page(doc.page_content)
+            yield doc.page_content
+
+    temp_paths = []
+    def temp_file():
+        f = tempfile.NamedTemporaryFile("wb", dir=target_path.parent, prefix=f".{target_path.name}.", suffix=".part", delete=False)
+        temp_paths.append(Path(f.name))
+        return f
 
-def main():
-    # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") # uncomment if you need TIMESTAMP
-    files_processed = 0
-    processed_files = get_already_processed()
-    new_log_entries = []
     try:
-        for file_path in SRC_DIR.rglob("*"):
-            if not file_path.is_file():
-                continue
-            
-            original_filename = file_path.name  # e.g. "book.pdf"
-    
-            if original_filename in processed_files:
-                print(f"[SKIP] Already extracted: {file_path}")
+        with temp_file() as f:
+            spans = write_pages(pages(), f)
+        if not spans:
+            return {"status": "no_text", "loader": loader_name}
+        final_path = temp_paths[-1]
+
+        stripped = []
+        if detector is not None and paged and detector.running_keys():
+            def cleaned_pages():
+                nonlocal chars
+                chars = 0
+                for page_num, text in enumerate(read_pages(final_path, spans)):
+                    text, dropped = detector.strip_page(page_num, text)
+                    stripped.extend(dropped)
+                    chars += len(text)
+                    yield text
+            with temp_file() as f:
+                spans = write_pages(cleaned_pages(), f)
+            final_path = temp_paths[-1]
+
+        install_file(final_path, target_path)  # compressed on the way if TEXT_COMPRESSION is set
+    except Exception as e:
+        # Same contract as detect_and_load_text: a broken file is "no text", not a crash
+        log.error(f"[ERROR] Failed to load {file_path}: {e}")
+        return {"status": "no_text", "loader": loader_name, "error": str(e)}
+    finally:
+        for path in temp_paths:
+            path.unlink(missing_ok=True)
+
+    # Keep stripped headers in a sidecar, "book.pdf.txt" → "book.pdf.headers.json"
+    if stripped:
+        write_stripped_headers(target_path, stripped)
+    # Pages for ocr.py to fill in, "book.pdf.txt" → "book.pdf.ocr_pages.json"
+    if not paged or file_path.suffix.lower() not in OCR_SOURCE_SUFFIXES:
+        ocr_pages = []
+    write_ocr_plan(target_path, ocr_pages)
+    # Byte span and status of every page, "book.pdf.txt" → "book.pdf.pages.json"
+    queued = set(ocr_pages)
+    statuses = ["ocr_pending" if page_num in queued else "blank" if score is None else "text"
+                for page_num, score in enumerate(page_scores)]
+    write_page_index(target_path, spans, loader_name, statuses)
+    quality = file_quality(page_scores, page_weights)
+    if ocr_pages:
+        log.debug("[HYBRID]", extra={"fields": {"file": str(file_path), "ocr_pages": len(ocr_pages),
+                                                 "pages": len(spans), "quality": quality}})
+
+    return {"status": "ok", "loader": loader_name, "output_path": str(target_path), "chars": chars,
+            "quality": quality, "page_scores": json.dumps([None if x is None else round(x, 3) for x in page_scores])}
+
+def copy_duplicate(file_path: Path, original) -> dict:
+    """Reuse the output of a byte-identical file extracted under another name."""
+    target_path = output_path_for(file_path)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    copy_text(Path(original["output_path"]), target_path)
+    for sidecar_path in (ocr_plan_path, page_index_path, headers_path):
+        if sidecar_path(Path(original["output_path"])).exists():
+            shutil.copyfile(sidecar_path(Path(original["output_path"])), sidecar_path(target_path))
+    return {"loader": original["loader"], "output_path": str(target_path), "chars": original["chars"],
+            "quality": original["quality"], "page_scores": original["page_scores"],
+            "duplicate_of": original["rel_path"]}
+
+def group_identical(pending: list[tuple]) -> tuple[list[tuple], dict[Path, list[tuple]]]:
+    """
+    Split files new in this run into one file per content to extract and the
+    byte-identical rest, keyed by the file they will be copied from.
+    Only files sharing a size with another pending file are hashed.
+    """
+    by_size = {}
+    for item in pending:
+        by_size.setdefault(item[1].st_size, []).append(item)
+    leaders, followers, by_hash = [], {}, {}
+    for file_path, stat, sha256 in pending:
+        if len(by_size[stat.st_size]) > 1:
+            sha256 = sha256 or file_sha256(file_path)
+            if sha256 in by_hash:
+                followers[by_hash[sha256]].append((file_path, stat, sha256))
                 continue
-            
-            docs = detect_and_load_text(str(file_path))
-            if not docs:
+            by_hash[sha256] = file_path
+            followers[file_path] = []
+        leaders.append((file_path, stat, sha256))
+    return leaders, followers
+
+def main():
+    files_processed = files_failed = files_duplicate = 0
+    manifest = ExtractionManifest(MANIFEST, SRC_DIR)
+    initialize_manifest_from_existing_outputs(manifest)
+
+    source_files = [p for p in SRC_DIR.rglob("*") if p.is_file()]
+    pending = []  # (file_path, stat, sha256 or None)
+    for file_path in source_files:
+        stat = file_path.stat()
+        if manifest.is_current(file_path, stat):
+            log.debug("[SKIP] Already extracted", extra={"fields": {"file": str(file_path)}})
+            continue
+        sha256, original = manifest.find_duplicate(file_path, stat)
+        if original is not None:
+            result = copy_duplicate(file_path, original)
+            manifest.record(manifest.rel_path(file_path), stat, "duplicate", sha256=sha256, **result)
+            log.debug("[DUPLICATE]", extra={"fields": {"file": str(file_path), "of": original["rel_path"]}})
+            files_duplicate += 1
+            continue
+        pending.append((file_path, stat, sha256))
+    # Identical files new in this run: extract one, copy it to the others once it is done
+    pending, identical = group_identical(pending)
+    waiting = sum(len(group) for group in identical.values())
+    log.info(f"[INIT] {len(pending)} of {len(source_files)} files to extract, {waiting} identical to one of them, "
+             f"workers: {EXTRACT_WORKERS}")
+
+    stats = {file_path: (stat, sha256) for file_path, stat, sha256 in pending}
+    tasks = [file_path for file_path, _, _ in pending]
+    if EXTRACT_WORKERS > 1 or EXTRACT_TIMEOUT:
+        results = run_isolated(tasks, extract_file, EXTRACT_WORKERS, EXTRACT_TIMEOUT)
+    else:
+        results = run_inline(tasks, extract_file)
+
+    progress = Progress(log, "extract", total=len(tasks))
+    try:
+        # Every finished file is committed to the manifest right away, Ctrl+C loses nothing
+        for file_path, status, result in results:
+            progress.update()
+            stat, sha256 = stats.pop(file_path)
+            rel_path = manifest.rel_path(file_path)
+            if status != "ok":
+                files_failed += 1
+                manifest.record(rel_path, stat, status, sha256=sha256, error=result)
+                log.error(f"[{status.upper()}] {file_path}: {result}")
                 continue
-            
-            # Join all pages into one text blob
-            text = "\n\n".join(doc.page_content for doc in docs)
-    
-            # Save extracted text with timestamp suffix
-            target_dir = DST_DIR / file_path.relative_to(SRC_DIR).parent
-            target_dir.mkdir(parents=True, exist_ok=True)
-    
-            new_filename = f"{original_filename}.txt" # comment if you need TIMESTAMP and uncomment next line
-            # new_filename = f"{original_filename}_{timestamp}.txt"  # book.pdf_20250524_153012.txt 
-            target_path = target_dir / new_filename
-    
-            with target_path.open("w", encoding="utf-8") as f:
-                f.write(text)
-    
-            print(f"[EXTRACTED] {file_path} → {target_path}")
-            files_processed += 1
-            new_log_entries.append(original_filename)
-    
+            manifest.record(rel_path, stat, sha256=sha256, **result)
+            if result["status"] == "ok":
+                log.debug("[EXTRACTED]", extra={"fields": {"file": str(file_path), **result}})
+                files_processed += 1
+            for copy_path, copy_stat, copy_sha256 in identical.get(file_path, []):
+                copy_rel_path = manifest.rel_path(copy_path)
+                if result["status"] != "ok":
+                    # Same bytes, same outcome: no_text or unsupported as well
+                    manifest.record(copy_rel_path, copy_stat, sha256=copy_sha256, **result)
+                    continue
+                copied = copy_duplicate(copy_path, manifest.get(rel_path))
+                manifest.record(copy_rel_path, copy_stat, "duplicate", sha256=copy_sha256, **copied)
+                log.debug("[DUPLICATE]", extra={"fields": {"file": str(copy_path), "of": rel_path}})
+                files_duplicate += 1
+
     except KeyboardInterrupt:
-        print("\n[INTERRUPTED] Gracefully handling Ctrl+C...")
+        log.warning("\n[INTERRUPTED] Gracefully handling Ctrl+C...")
     except Exception as e:
-        print(f"[ERROR] Unexpected error during processing: {e}")
+        log.exception(f"[ERROR] Unexpected error during processing: {e}")
     finally:
-        if new_log_entries:
-            LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
-            with LOG_FILE.open("a", encoding="utf-8") as log_f:
-                for entry in new_log_entries:
-                    log_f.write(f"{entry}\n")
-            print(f"[LOG] Wrote {len(new_log_entries)} new entries to log file: {LOG_FILE}")
-
-        print(f"[DONE] Extracted text from {files_processed} files.")
+        results.close()  # kills any workers still running
+        manifest.close()
+        progress.close()
+        if files_failed:
+            log.info(f"[LOG] {files_failed} failed files recorded in {MANIFEST}")
+        log.info(f"[DONE] Extracted text from {files_processed} files, {files_duplicate} duplicates reused.")
 
 if __name__ == "__main__":
-    initialize_log_from_existing_outputs()
     main()
     if os.getenv("OCR_ON_EMPTY", "false").lower() == "true":
-         perform_ocr_workflow()
+        run_ocr_batch()
 '''
    OCR only proceeds:
    if .env flag is true,
    and the user confirms at the prompt.
 
-First run: populates log and skips extracted files.
-Second run: nothing duplicated.
-LOG_FILE acts as ground truth.
+First run: populates the manifest from existing outputs and skips extracted files.
+Second run: nothing duplicated, changed sources (size/mtime/hash) are re-extracted.
+The manifest next to LOG_FILE acts as ground truth.
     # After extraction, scan the destination folder for extracted .txt files.
     # If any .txt file is empty, look back at the source folder for files with the same base name (stem).
     # For those source files, perform OCR (e.g., using Tesseract) to extract text.
@@ -0,0 +1,158 @@
+"""
+    Running header/footer detection.
+    Looks at the first and last lines of every page, reduces them to a fuzzy
+    key (case, page numbers and common OCR confusions folded) and strips lines
+    whose key keeps repeating at page edges: running heads, book titles, page numbers.
+    Keys with a folded page number only count on the outermost line of a page,
+    so body lines like "3 cups of flour" near an edge are left alone.
+"""
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+
+EDGE_DEPTH = 2     # lines checked at the top and at the bottom of each page
+MIN_REPEAT = 3     # a key must show up on at least this many pages
+PAGE_WINDOW = 2    # ...and recur within this many pages (odd/even running heads)
+MAX_LINE_LENGTH = 100  # longer edge lines are body text, never headers
+
+# Characters OCR tends to mix up, folded to one representative
+OCR_CONFUSIONS = str.maketrans({"l": "i", "1": "i", "0": "o", "5": "s"})
+OCR_DIGIT_CONFUSIONS = str.maketrans({"l": "1", "i": "1", "o": "0", "s": "5"})
+ROMAN_NUMERAL = re.compile(r"^(?=[ivxlcdm])m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})\.?$")
+
+
+def line_key(line: str) -> str:
+    """Fuzzy hash of a line: equal for "Chapter 3 - 41" and "CHAPTER 3 — 4l"."""
+    text = line.strip().lower()
+    if len(text) > MAX_LINE_LENGTH:
+        return ""
+    if ROMAN_NUMERAL.fullmatch(text):
+        return "#"  # front matter page numbers
+    parts = []
+    tokens = re.findall(r"[^\W_]+", text)
+    for i, token in enumerate(tokens):
+        page_number_position = i in (0, len(tokens) - 1)
+        if (page_number_position and any(c.isdigit() for c in token)
+                and token.translate(OCR_DIGIT_CONFUSIONS).isdigit()):
+            parts.append("#")  # page numbers, "4l" included
+        else:
+            parts.append(token.translate(OCR_CONFUSIONS).replace("rn", "m"))
+    return "".join(parts)
+
+
+def edge_line_indexes(lines: list[str], depth: int = EDGE_DEPTH) -> list[int]:
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return sorted(set(filled[:depth] + filled[-depth:]))
+
+
+def edge_keys(lines: list[str]) -> dict[int, str]:
+    """Line index → key of the edge lines; page number keys only on the first and last line."""
+    indexes = edge_line_indexes(lines)
+    boundary = set(edge_line_indexes(lines, depth=1))
+    keys = {}
+    for i in indexes:
+        key = line_key(lines[i])
+        if key and ("#" not in key or i in boundary):
+            keys[i] = key
+    return keys
+
+
+class HeaderDetector:
+    """
+    Streaming form of strip_running_headers: add_page() every page in order,
+    then strip_page() them in a second pass. Only the fuzzy keys of edge lines
+    are kept between passes, so memory does not grow with the page text.
+    """
+    def __init__(self, min_repeat: int = MIN_REPEAT):
+        self.min_repeat = min_repeat
+        self.page_keys = []  # per page: set of edge line keys
+        self._running = None
+
+    def add_page(self, text: str):
+        self.page_keys.append(set(edge_keys(text.splitlines()).values()))
+        self._running = None
+
+    def running_keys(self) -> set[str]:
+        if self._running is not None:
+            return self._running
+        seen_on = defaultdict(list)
+        for page_num, keys in enumerate(self.page_keys):
+            for key in keys:
+                seen_on[key].append(page_num)
+
+        running = set()
+        for key, page_nums in seen_on.items():
+            if len(page_nums) < self.min_repeat:
+                continue
+            # Count occurrences that have a neighbour close by, not one-off coincidences
+            close = sum(
+                1 for a, b in zip(page_nums, page_nums[1:]) if b - a <= PAGE_WINDOW
+            )
+            if close + 1 >= self.min_repeat:
+                running.add(key)
+        self._running = running
+        return running
+
+    def strip_page(self, page_num: int, text: str) -> tuple[str, list[dict]]:
+        """Clean one page (page_num from 0), returns text and [{"page": n, "line": text}] with n from 1."""
+        running = self.running_keys()
+        if not running or not self.page_keys[page_num] & running:
+            return text, []
+        lines = text.splitlines()
+        drop = {i for i, key in edge_keys(lines).items() if key in running}
+        stripped = [{"page": page_num + 1, "line": lines[i].strip()} for i in sorted(drop)]
+        return "\n".join(line for i, line in enumerate(lines) if i not in drop), stripped
+
+
+def strip_running_headers(pages: list[str]) -> tuple[list[str], list[dict]]:
+    """
+    Remove running headers/footers from a list of page texts.
+    Returns cleaned pages and the stripped lines as [{"page": n, "line": text}],
+    page numbers starting at 1, so callers can keep them in a sidecar.
+    """
+    detector = HeaderDetector()
+    for page in pages:
+        detector.add_page(page)
+
+    cleaned, stripped = [], []
+    for page_num, page in enumerate(pages):
+        text, dropped = detector.strip_page(page_num, page)
+        cleaned.append(text)
+        stripped.extend(dropped)
+    return cleaned, stripped
+
+
+def headers_path(txt_path: Path) -> Path:
+    return Path(txt_path).with_suffix(".headers.json")  # "book.pdf.txt" → "book.pdf.headers.json"
+
+
+def read_stripped_headers(txt_path: Path) -> list[dict]:
+    path = headers_path(txt_path)
+    if not path.exists():
+        return []
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_stripped_headers(txt_path: Path, stripped: list[dict]):
+    with headers_path(txt_path).open("w", encoding="utf-8") as f:
+        json.dump(sorted(stripped, key=lambda entry: entry["page"]), f, ensure_ascii=False)
+
+
+def strip_known_headers(pages: dict[int, str], stripped: list[dict]) -> tuple[dict[int, str], list[dict]]:
+    """
+    Strip pages recognized after extraction (page_num from 0 → text) with the
+    running headers already found on the text-layer pages, see extract.py.
+    Returns the cleaned pages and their stripped lines, in the sidecar format.
+    """
+    keys = {key for key in (line_key(entry["line"]) for entry in stripped) if key}
+    if not keys:
+        return pages, []
+    cleaned, dropped = {}, []
+    for page_num, text in pages.items():
+        lines = text.splitlines()
+        drop = {i for i, key in edge_keys(lines).items() if key in keys}
+        dropped.extend({"page": page_num + 1, "line": lines[i].strip()} for i in sorted(drop))
+        cleaned[page_num] = "\n".join(line for i, line in enumerate(lines) if i not in drop) if drop else text
+    return cleaned, dropped
@@ -1,8 +1,11 @@
+import io
 import os
 import shutil
 import subprocess
 import tempfile
 import xml.etree.ElementTree as ET
+from urllib.parse import unquote
+from collections.abc import Iterator
 from xml.etree.ElementTree import QName
 from bs4 import BeautifulSoup
 from pathlib import Path
@@ -11,7 +14,11 @@ from langchain_community.document_loaders import (
     PyPDFLoader, UnstructuredMarkdownLoader, UnstructuredWordDocumentLoader,
     UnstructuredEPubLoader, TextLoader)
 from langchain.schema import Document
+from extractor.conversion_cache import converted
+from extractor.ocr_engine import djvu_page_count
+from extractor.page_quality import classify_page, image_coverage
 from pypdf import PdfReader
+import fitz  # PyMuPDF
 from striprtf.striprtf import rtf_to_text
 from unstructured.partition.doc import partition_doc
 from unstructured.partition.html import partition_html
@@ -26,25 +33,29 @@ class SafeTextLoader(TextLoader):
 class UnstructuredDocLoader:
     def __init__(self, file_path):
         self.file_path = file_path
+    def lazy_load(self) -> Iterator[Document]:
+        for el in partition_doc(filename=self.file_path):
+            yield Document(page_content=str(el))
     def load(self) -> list[Document]:
-        elements = partition_doc(filename=self.file_path)
-        return [Document(page_content=str(el)) for el in elements]
+        return list(self.lazy_load())
 
 # ========== .rtf loader using striprtf ==========
 class RTFLoader:
     def __init__(self, file_path):
         self.file_path = file_path
-    def load(self) -> list[Document]:
+    def lazy_load(self) -> Iterator[Document]:
         with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as f:
             content = rtf_to_text(f.read())
-        return [Document(page_content=content)]
+        yield Document(page_content=content)
+    def load(self) -> list[Document]:
+        return list(self.lazy_load())
 
 # ========== .djvu loader using djvu.decode (basic) ==========
 class DidjvuLoader:
     def __init__(self, file_path: str):
         self.file_path = file_path
 
-    def load(self) -> list[Document]:
+    def lazy_load(self) -> Iterator[Document]:
         if not shutil.which("djvutxt"):
             raise EnvironmentError("djvutxt is not installed. sudo apt install djvulibre-bin")
 
@@ -53,38 +64,104 @@ class DidjvuLoader:
         if not djvu_path.exists():
             raise FileNotFoundError(f"DjVu file not found: {self.file_path}")
 
-        try:
-            # Extract text using djvutxt
-            result = subprocess.run(
-                ["djvutxt", self.file_path],
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            full_text = result.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"djvutxt failed: {e.stderr}")
-
-        return [Document(page_content=full_text)]
+        def page_doc(text, page):
+            return Document(page_content=text.strip(), metadata={"source": self.file_path, "page": page})
+
+        def djvutxt(out, *args):
+            result = subprocess.run(["djvutxt", *args, self.file_path], stdout=out, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                raise RuntimeError(f"djvutxt failed: {result.stderr.decode(errors='ignore')}")
+
+        # Page numbers must match the DjVu pages, the page index and OCR plan point ocr_engine at them
+        expected = djvu_page_count(djvu_path)
+        # Spooled to disk, not memory: form feeds are only trusted once counted against the page count
+        with tempfile.TemporaryFile() as out:
+            djvutxt(out)
+            separators, last = 0, b""
+            out.seek(0)
+            for chunk in iter(lambda: out.read(1 << 16), b""):
+                separators += chunk.count(b"\f")
+                last = chunk
+            # Some djvulibre versions end every page with a form feed, others only separate them
+            found = separators if last.rstrip(b" \t\r\n").endswith(b"\f") else separators + 1
+
+            if found == expected:
+                out.seek(0)
+                text = io.TextIOWrapper(out, encoding="utf-8", errors="ignore")
+                page, parts = 0, []
+                for chunk in iter(lambda: text.read(1 << 16), ""):
+                    *finished, rest = chunk.split("\f")
+                    for piece in finished:
+                        parts.append(piece)
+                        yield page_doc("".join(parts), page)
+                        page, parts = page + 1, []
+                    parts.append(rest)
+                if page < expected:
+                    yield page_doc("".join(parts), page)
+                return
+
+        # Separators missing or extra: one djvutxt run per page keeps the numbering right
+        print(f"[WARN] djvutxt gave {found} pages for {expected} in {self.file_path}, extracting page by page")
+        for page in range(expected):
+            with tempfile.TemporaryFile() as out:
+                djvutxt(out, f"--page={page + 1}")
+                out.seek(0)
+                yield page_doc(out.read().decode("utf-8", errors="ignore").replace("\f", ""), page)
+
+    def load(self) -> list[Document]:
+        return list(self.lazy_load())
 
 # ========== .chm loader using extract_chmlib ==========
 class CHMLoader:
+    """
+    One document per CHM topic, in table-of-contents order (.hhc sitemap),
+    then any HTML files the TOC does not list. Markup is dropped through partition_html.
+    """
     def __init__(self, file_path):
         self.file_path = file_path
-    
+
+    @staticmethod
+    def extract(file_path, out_dir: Path):
+        subprocess.run(["extract_chmLib", str(file_path), str(out_dir)], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    @staticmethod
+    def toc_order(extract_dir: Path) -> list[Path]:
+        """HTML files in sitemap order, unlisted ones after them sorted by path."""
+        root = extract_dir.resolve()
+        ordered = []
+        seen = set()
+        for hhc in sorted(extract_dir.rglob("*.hhc")):
+            with open(hhc, "r", encoding="utf-8", errors="ignore") as f:
+                soup = BeautifulSoup(f.read(), "html.parser")
+            for param in soup.find_all("param"):
+                if str(param.get("name", "")).lower() != "local":
+                    continue
+                # URL-encoded and relative to the archive root: "ms-its:book.chm::/Part%201/ch1.htm#top"
+                local = unquote(str(param.get("value", "")).split("::", 1)[-1].split("#", 1)[0])
+                local = local.replace("\\", "/").lstrip("/")
+                html_file = (root / local).resolve()
+                if (local and html_file not in seen and html_file.is_relative_to(root)
+                        and html_file.is_file()):
+                    seen.add(html_file)
+                    ordered.append(html_file)
+        rest = sorted(p.resolve() for p in extract_dir.rglob("*.htm*") if p.is_file())
+        return ordered + [p for p in rest if p not in seen and p.is_relative_to(root)]
+
+    def lazy_load(self) -> Iterator[Document]:
+        # Extracted once per archive content into the conversion cache or a private temp dir
+        with converted("chm-html", self.file_path, lambda out_dir: self.extract(self.file_path, out_dir)) as extract_dir:
+            for page, html_file in enumerate(self.toc_order(extract_dir)):
+                with open(html_file, "r", encoding="utf-8", errors="ignore") as f:
+                    elements = partition_html(text=f.read())
+                text = "\n\n".join(el.text for el in elements if el.text)
+                yield Document(page_content=text, metadata={
+                    "source": self.file_path, "page": page,
+                    "chm_path": html_file.relative_to(extract_dir.resolve()).as_posix(),
+                })
+
     def load(self) -> list[Document]:
-        extract_dir = Path("/tmp/chm_extract")
-        extract_dir.mkdir(parents=True, exist_ok=True)
-        print(f"[DEBUG] Extracting CHM file {self.file_path} to {extract_dir}")
-
-        subprocess.run(["extract_chmLib", self.file_path, str(extract_dir)])
-        text = ""
-        for html_file in extract_dir.rglob("*.htm*"):
-            with open(html_file, "r", encoding="utf-8", errors="ignore") as f:
-                text += f.read() + "\n"
-        print(f"[DEBUG] Finished extracting CHM, total length {len(text)} chars")
-        return [Document(page_content=text)]
+        return list(self.lazy_load())
 
 # Some .chm files can't be parsed well because they're binary-encoded archives.
 #     Extract .chm manually:
@@ -98,10 +175,15 @@ class UnstructuredHTMLLoader:
     def __init__(self, file_path):
         self.file_path = file_path
 
-    def load(self):
+    def lazy_load(self) -> Iterator[Document]:
         with open(self.file_path, "r", encoding="utf-8", errors="ignore") as f:
             elements = partition_html(text=f.read())
-        return [Document(page_content=el.text) for el in elements if el.text]
+        for el in elements:
+            if el.text:
+                yield Document(page_content=el.text)
+
+    def load(self) -> list[Document]:
+        return list(self.lazy_load())
 
 # ========== .mobi loader using ebooklib and bs4 ==========
 # Class to fix Path vs str problem in UnstructuredEPubLoader
@@ -114,14 +196,12 @@ class MOBILoader:
     def __init__(self, file_path):
         self.file_path = Path(file_path)
 
-    def load(self) -> list[Document]:
+    def lazy_load(self) -> Iterator[Document]:
         if not shutil.which("ebook-convert"):
             raise EnvironmentError("'ebook-convert' not found. Please install Calibre CLI.")
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmpdir_path = Path(tmpdir)
-            epub_path = tmpdir_path / (self.file_path.stem + ".epub")
-
+        def convert(out_dir: Path):
+            epub_path = out_dir / "book.epub"
             try:
                 subprocess.run(
                     ["ebook-convert", str(self.file_path), str(epub_path)],
@@ -134,18 +214,101 @@ class MOBILoader:
 
             if not epub_path.exists():
                 raise FileNotFoundError(f"Conversion failed, EPUB not found at {epub_path}")
-            return FixedEPubLoader(epub_path).load()
+
+        # Converted once per book content, see extractor/conversion_cache.py
+        with converted("mobi-epub", self.file_path, convert) as out_dir:
+            yield from FixedEPubLoader(out_dir / "book.epub").lazy_load()
+
+    def load(self) -> list[Document]:
+        return list(self.lazy_load())
 
 # ========== .pdf loader ==========
 class PyPDFLoaderWithPassword(PyPDFLoader):
+    """
+    Text layer per page, plus "text_layer" metadata from extractor.page_quality:
+    "text", "ocr" (scan or broken text layer) or "blank". Image coverage comes from PyMuPDF.
+    """
     def __init__(self, file_path, password=None):
         super().__init__(file_path)
         self.password = password
 
-    def load(self) -> list[Document]:
+    def open_fitz(self):
+        """PyMuPDF document for image coverage, None if PyMuPDF cannot open what pypdf can."""
+        try:
+            doc = fitz.open(self.file_path)
+        except Exception as e:
+            print(f"[WARN] PyMuPDF cannot open {self.file_path}, classifying pages on text only: {e}")
+            return None
+        if self.password:
+            doc.authenticate(self.password)
+        return doc
+
+    @staticmethod
+    def coverage(doc, i: int) -> float:
+        # 0 classifies the page on its text alone
+        if doc is None:
+            return 0.0
+        try:
+            return image_coverage(doc[i])
+        except Exception:
+            return 0.0  # page counts differ, or a page PyMuPDF cannot parse
+
+    def lazy_load(self) -> Iterator[Document]:
         reader = PdfReader(self.file_path, password=self.password)
-        texts = [page.extract_text() or "" for page in reader.pages]
-        return [Document(page_content="\n".join(texts))]
+        doc = self.open_fitz()
+        try:
+            for i, page in enumerate(reader.pages):
+                text = page.extract_text() or ""
+                text_layer = classify_page(text, self.coverage(doc, i))
+                yield Document(page_content=text, metadata={"source": self.file_path, "page": i, "text_layer": text_layer})
+        finally:
+            if doc is not None:
+                doc.close()
+
+    def load(self) -> list[Document]:
+        return list(self.lazy_load())
+
+# ========== streaming XML helpers ==========
+SNIFF_BYTES = 64 * 1024  # export type is decided from the root element and this much of the file
+
+
+def localname(tag: str) -> str:
+    """Strip namespace and return local tag name."""
+    return tag.split("}", 1)[1] if tag.startswith("{") else tag
+
+
+def root_localname(file_path: str) -> str | None:
+    try:
+        for event, elem in ET.iterparse(file_path, events=("start",)):
+            return localname(elem.tag)
+    except ET.ParseError:
+        return None
+    return None
+
+
+def iter_xml_elements(file_path: str, name: str) -> Iterator[ET.Element]:
+    """
+    Yield each complete element with the given local name, then drop it from
+    its parent so memory stays flat however large the export is.
+    """
+    parents = []
+    for event, elem in ET.iterparse(file_path, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        if localname(elem.tag) != name:
+            continue
+        yield elem
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+
+
+def element_text(elem: ET.Element, path: str, ns: dict) -> str:
+    found = elem.find(path, ns)
+    return found.text or "" if found is not None else ""
+
 
 # ========== .xml Blogspot loader ==========
 class BlogspotXMLLoader:
@@ -155,67 +318,44 @@ class BlogspotXMLLoader:
 
     @staticmethod
     def is_blogspot_export(file_path: str) -> bool:
-        # Strip namespace and return local tag name.
-        def localname(tag: str) -> str:    
-            if tag.startswith("{"):
-                return tag.split("}", 1)[1]
-            return tag
-
-        try:
-            for event, elem in ET.iterparse(file_path, events=("start",)):
-                if localname(elem.tag) == "feed":
-                    # Blogger-specific hints
-                    content = Path(file_path).read_text(encoding="utf-8", errors="ignore").lower()
-                    if "schemas.google.com/blogger" in content or "www.blogger.com" in content:
-                        return True
-                    return False
-                break
-        except ET.ParseError:
+        if root_localname(file_path) != "feed":
             return False
-        return False
-
-    def load(self) -> list[Document]:
-        tree = ET.parse(self.file_path)
-        root = tree.getroot()
+        # Blogger-specific hints, declared in the feed header
+        with open(file_path, "rb") as f:
+            head = f.read(SNIFF_BYTES).decode("utf-8", errors="ignore").lower()
+        return "schemas.google.com/blogger" in head or "www.blogger.com" in head
 
+    def lazy_load(self) -> Iterator[Document]:
         ns = {
             "atom": "http://www.w3.org/2005/Atom"
         }
+        normalized_filter = {tag.strip().lower() for tag in self.tags_filter or []}
 
-        documents = []
-        for entry in root.findall("atom:entry", ns):
-            kind = entry.find("atom:category", ns)
+        for entry in iter_xml_elements(self.file_path, "entry"):
             categories = entry.findall("atom:category", ns)
             tags = [cat.attrib.get("term", "") for cat in categories if cat.attrib.get("term")]
-            # --- Normalize tags ---
-            normalized_tags = {tag.strip().lower() for tag in tags}
-            normalized_filter = {tag.strip().lower() for tag in self.tags_filter}
-
+            # --- Ensure this is a real blog post (not settings, template or comment) ---
+            if not any(tag.endswith("#post") for tag in tags):
+                continue
             # --- Apply tag filter if defined ---
-            if self.tags_filter:
+            if normalized_filter:
+                normalized_tags = {tag.strip().lower() for tag in tags}
                 if not normalized_tags & normalized_filter:
                     continue
-            # --- Ensure this is a real blog post ---
-            if not any(tag.endswith("#post") for tag in tags):
-                print(f"[MATCH] Tags: {tags} → matched: {normalized_tags & normalized_filter}")
-                continue
 
-            # if kind is not None and kind.attrib.get("term", "").endswith("#post"):
-            title_el = entry.find("atom:title", ns)
-            content_el = entry.find("atom:content", ns)
-            pub_date_el = entry.find("atom:published", ns)
             # --- Advantage of HTML in getting images and other data ---
-            title = title_el.text if title_el is not None else ""
-            content = content_el.text if content_el is not None else ""
-            pub_date = pub_date_el.text if pub_date_el is not None else ""
+            title = element_text(entry, "atom:title", ns)
+            content = element_text(entry, "atom:content", ns)
+            pub_date = element_text(entry, "atom:published", ns)
             full_text = f"{title}\n{pub_date}\n\n{content}".strip()
             # --- BeautifulSoup removes links to images and videos ---
-            # raw_html = content_el.text if content_el is not None else "" # BeautifulSoup
-            # clean_text = BeautifulSoup(raw_html, "html.parser").get_text(separator="\n\n")
+            # clean_text = BeautifulSoup(content, "html.parser").get_text(separator="\n\n")
             # full_text = f"{title}\n{pub_date}\n\n{clean_text}".strip() # BeautifulSoup
             if full_text:
-                documents.append(Document(page_content=full_text))
-        return documents
+                yield Document(page_content=full_text, metadata={"source": self.file_path})
+
+    def load(self) -> list[Document]:
+        return list(self.lazy_load())
     
 # ========== .xml WordPress loader ==========
 class WordPressXMLLoader:
@@ -224,48 +364,35 @@ class WordPressXMLLoader:
 
     @staticmethod
     def is_wordpress_export(file_path: str) -> bool:
-        try:
-            for event, elem in ET.iterparse(file_path, events=("start",)):
-                if elem.tag == "rss" and "wordpress.org/export" in str(elem.attrib.get("xmlns:wp", "")):
-                    return True
-                if elem.tag.endswith("rss"):
-                    # Check for WordPress namespace
-                    for k, v in elem.attrib.items():
-                        if "wordpress.org/export" in v:
-                            return True
-                break  # We only need the root
-        except ET.ParseError:
+        if root_localname(file_path) != "rss":
             return False
-        return False
-
-    def load(self) -> list[Document]:
-        tree = ET.parse(self.file_path)
-        root = tree.getroot()
+        # ElementTree does not report xmlns attributes, so look for the namespace in the header
+        with open(file_path, "rb") as f:
+            head = f.read(SNIFF_BYTES).decode("utf-8", errors="ignore")
+        return "wordpress.org/export" in head
 
+    def lazy_load(self) -> Iterator[Document]:
         ns = {
             "wp": "http://wordpress.org/export/1.2/",
             "content": "http://purl.org/rss/1.0/modules/content/",
             "dc": "http://purl.org/dc/elements/1.1/"
         }
 
-        documents = []
-        for item in root.findall(".//item"):
-            title_el = item.find("title")
-            content_el = item.find("content:encoded", ns)
-            pub_date_el = item.find("pubDate")
-
-            title = title_el.text if title_el is not None else ""
-            content = content_el.text if content_el is not None else ""
-            pub_date = pub_date_el.text if pub_date_el is not None else ""
+        for item in iter_xml_elements(self.file_path, "item"):
+            title = element_text(item, "title", ns)
+            content = element_text(item, "content:encoded", ns)
+            pub_date = element_text(item, "pubDate", ns)
 
             full_text = f"{title}\n{pub_date}\n\n{content}".strip()
             if full_text:
-                documents.append(Document(page_content=full_text))
+                yield Document(page_content=full_text, metadata={"source": self.file_path})
 
-        return documents
+    def load(self) -> list[Document]:
+        return list(self.lazy_load())
 
 # ========== Loader Dispatcher ==========
-def detect_and_load_text(file_path: str, pdf_password: str = None) -> list[Document] | None:
+def get_loader(file_path: str, pdf_password: str = None):
+    """Pick the loader for a file, None if the type is not supported."""
     ext = os.path.splitext(file_path)[-1].lower()
 
     if ext == ".pdf":
@@ -280,7 +407,7 @@ def detect_and_load_text(file_path: str, pdf_password: str = None) -> list[Docum
             loader = BlogspotXMLLoader(file_path, tags_filter=tags_filter)
         else:
             print(f"[INFO] .xml file not recognized as WordPress or Blogspot export: {file_path}")
-            return []
+            return None
 
     else:
         loader_map = {
@@ -302,7 +429,18 @@ def detect_and_load_text(file_path: str, pdf_password: str = None) -> list[Docum
         if loader_cls is None:
             return None
         loader = loader_cls(file_path)
-
+    return loader
+
+def detect_and_lazy_load_text(file_path: str, pdf_password: str = None, loader=None) -> Iterator[Document]:
+    """Yield documents (pages) one by one, exceptions from the loader propagate."""
+    loader = loader or get_loader(file_path, pdf_password)
+    if loader is not None:
+        yield from loader.lazy_load()
+
+def detect_and_load_text(file_path: str, pdf_password: str = None, loader=None) -> list[Document] | None:
+    loader = loader or get_loader(file_path, pdf_password)
+    if loader is None:
+        return None
     try:
         return loader.load()
     except Exception as e:
@@ -0,0 +1,133 @@
+"""
+    Content-addressed extraction manifest (SQLite).
+    One row per source file keyed by its path relative to SRC_DIR:
+    size, mtime, sha256, loader, output path, char count (NULL when not
+    known), status, the original a duplicate was copied from, and text
+    quality (file score plus a JSON list of page scores).
+    "unsupported" is not final: those files are looked at again next run,
+    a loader may have been added for them in the meantime.
+    Skip decisions come from a stat() comparison; files are hashed only
+    when the stat changed or a same-sized file may be a duplicate.
+"""
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+
+from common import textio
+
+DONE_STATUSES = ("ok", "no_text", "duplicate")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    rel_path    TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    sha256      TEXT,
+    loader      TEXT,
+    output_path TEXT,
+    chars       INTEGER,
+    status      TEXT NOT NULL,
+    error       TEXT,
+    duplicate_of TEXT,
+    quality     REAL,
+    page_scores TEXT,
+    updated     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_size ON files(size);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files(sha256);
+"""
+
+# Columns added after the first release, (name, type) for ALTER TABLE on older manifests
+ADDED_COLUMNS = [("quality", "REAL"), ("page_scores", "TEXT"), ("duplicate_of", "TEXT")]
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionManifest:
+    def __init__(self, db_path: Path, src_dir: Path):
+        self.src_dir = Path(src_dir)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        existing = {row["name"] for row in self.conn.execute("PRAGMA table_info(files)")}
+        for name, sql_type in ADDED_COLUMNS:
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {name} {sql_type}")
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def rel_path(self, file_path: Path) -> str:
+        return Path(file_path).relative_to(self.src_dir).as_posix()
+
+    def get(self, rel_path: str) -> sqlite3.Row | None:
+        return self.conn.execute("SELECT * FROM files WHERE rel_path = ?", (rel_path,)).fetchone()
+
+    def record(self, rel_path: str, stat, status: str, **fields):
+        """Insert or update a row; stat is the os.stat_result the decision was based on."""
+        row = {"rel_path": rel_path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+               "status": status, "updated": time.time(), "duplicate_of": None, **fields}
+        columns = ", ".join(row)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in row if c != "rel_path")
+        self.conn.execute(
+            f"INSERT INTO files ({columns}) VALUES ({', '.join('?' * len(row))}) "
+            f"ON CONFLICT(rel_path) DO UPDATE SET {updates}",
+            tuple(row.values()),
+        )
+        self.conn.commit()
+
+    def is_current(self, file_path: Path, stat) -> bool:
+        """True if the file was already handled and has not changed since."""
+        row = self.get(self.rel_path(file_path))
+        if row is None or row["status"] not in DONE_STATUSES:
+            return False
+        if row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        if row["size"] != stat.st_size or row["sha256"] is None:
+            return False
+        # Touched but maybe not modified (copied tree, restored backup): compare content
+        if file_sha256(file_path) != row["sha256"]:
+            return False
+        self.conn.execute("UPDATE files SET mtime_ns = ? WHERE rel_path = ?", (stat.st_mtime_ns, row["rel_path"]))
+        self.conn.commit()
+        return True
+
+    def find_duplicate(self, file_path: Path, stat) -> tuple[str | None, sqlite3.Row | None]:
+        """
+        Look for an already extracted file with identical content.
+        Returns (sha256 or None if hashing was not needed, matching row or None).
+        """
+        rel_path = self.rel_path(file_path)
+        same_size = self.conn.execute(
+            "SELECT * FROM files WHERE size = ? AND status = 'ok' AND rel_path != ?",
+            (stat.st_size, rel_path),
+        ).fetchall()
+        if not same_size:
+            return None, None
+
+        sha256 = file_sha256(file_path)
+        for row in same_size:
+            other_hash = row["sha256"]
+            if other_hash is None:
+                other_path = self.src_dir / row["rel_path"]
+                if not other_path.exists():
+                    continue
+                other_hash = file_sha256(other_path)
+                self.conn.execute("UPDATE files SET sha256 = ? WHERE rel_path = ?", (other_hash, row["rel_path"]))
+                self.conn.commit()
+            if other_hash == sha256 and row["output_path"] and textio.exists(Path(row["output_path"])):
+                return sha256, row
+        return sha256, None
@@ -1,12 +1,20 @@
-import fitz  # PyMuPDF
-import io
 import os
 import pytesseract
 import re
-import subprocess
+import sys
+import time
 # PYTHONPATH=./src python scripts/ocr.py
 from pathlib import Path
 from PIL import Image
+from common import textio
+from common.language import detect_language_from_filename
+from extractor.dir_index import SourceIndex, find_ocr_texts
+from extractor.headers import read_stripped_headers, strip_known_headers, write_stripped_headers
+from extractor.ocr_engine import IMAGE_EXTENSIONS
+from extractor.ocr_queue import OCRQueue, parse_folder_priorities
+from extractor.page_index import join_pages, read_page_index, write_page_index
+from extractor.page_quality import merge_ocr_pages, ocr_plan_path, read_ocr_plan
+from extractor.ocr_scheduler import OCR_WORKERS, OCRJob, OCRScheduler, open_default_cache
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -14,83 +22,23 @@ DST_DIR = Path(os.getenv("DST_DIR")) # extracted text files
 SRC_DIR = Path(os.getenv("SRC_DIR")) # original files => pdf, etc
 OCRD_LOG=Path(os.getenv("OCRD_LOG")) # optically character recognised files list prevents overwriting
 OCR_CANDIDATES=Path(os.getenv("OCR_CANDIDATES")) # list of files to be OCRed appends from DST_DIR
+OCR_QUEUE = Path(os.getenv("OCR_QUEUE", "logs/ocr_queue.sqlite")) # batch mode job queue
+OCR_POLICY = os.getenv("OCR_POLICY", "sjf") # sjf | priority | fifo
+OCR_FOLDER_PRIORITY = parse_folder_priorities(os.getenv("OCR_FOLDER_PRIORITY", "")) # e.g. rare_books=10,inbox=5
+OCR_PAGE_BUDGET = int(os.getenv("OCR_PAGE_BUDGET", "0")) or None # max pages per batch run
+OCR_DEADLINE_MINUTES = float(os.getenv("OCR_DEADLINE_MINUTES", "0")) or None # stop starting new documents after this
+OCR_MAX_ATTEMPTS = int(os.getenv("OCR_MAX_ATTEMPTS", "3"))
 
 print("[.env] DST_DIR:", DST_DIR)
 print("[.env] SRC_DIR:", SRC_DIR)
 print("[.env] OCRD_LOG:", OCRD_LOG)
 print("[.env] OCR_CANDIDATES:", OCR_CANDIDATES)
 print("Searching...")
+
+PAGED_OCR_EXTENSIONS = IMAGE_EXTENSIONS | {".pdf", ".djvu"}
 # ========================================================================
 # ========================================================================
 # ========================================================================
-def detect_language_from_filename(file_path: Path) -> str:
-    name = file_path.name.lower()
-
-    lang_keywords = {
-        # Cyrillic and Slavic
-        "rus": "rus", "russian": "rus", "рос": "rus",
-        "ukr": "ukr", "ukrainian": "ukr",
-        # "bul": "bul", "bulgarian": "bul",
-        # "srp": "srp", "serbian": "srp",
-        # "srp_latn": "srp_latn",
-        "bel": "bel", "belarusian": "bel",
-        # "kaz": "kaz", "kazakh": "kaz",
-        # "uzb": "uzb", "uzbek": "uzb",
-        # "uzb_cyrl": "uzb_cyrl",
-        # "kir": "kir", "kyrgyz": "kir",
-        # "tgk": "tgk", "tajik": "tgk",
-        # "tat": "tat", "tatar": "tat",
-        # "mkd": "mkd", "macedonian": "mkd",
-
-        # Western languages
-        "eng": "eng", "english": "eng",
-        # "deu": "deu", "ger": "deu", "german": "deu",
-        # "fra": "fra", "fre": "fra", "french": "fra",
-        # "ita": "ita", "italian": "ita",
-        # "spa": "spa", "spanish": "spa",
-        # "por": "por", "portuguese": "por",
-        "pol": "pol", "polish": "pol", "polska": "pol",
-        # "nld": "nld", "dutch": "nld",
-        # "swe": "swe", "swedish": "swe",
-        # "dan": "dan", "danish": "dan",
-        "nor": "nor", "norwegian": "nor",
-        # "fin": "fin", "finnish": "fin",
-
-        # # Asian languages
-        # "chi_sim": "chi_sim", "zh_cn": "chi_sim", "simplified": "chi_sim",
-        # "chi_tra": "chi_tra", "zh_tw": "chi_tra", "traditional": "chi_tra",
-        # "jpn": "jpn", "japanese": "jpn",
-        # "kor": "kor", "korean": "kor",
-        # "hin": "hin", "hindi": "hin",
-        # "tam": "tam", "tamil": "tam",
-        # "tel": "tel", "telugu": "tel",
-        # "kan": "kan", "kannada": "kan",
-        # "mal": "mal", "malayalam": "mal",
-        # "mya": "mya", "burmese": "mya",
-        # "tha": "tha", "thai": "tha",
-        # "vie": "vie", "vietnamese": "vie",
-
-        # Others
-        # "ara": "ara", "arabic": "ara",
-        # "heb": "heb", "hebrew": "heb",
-        # "grc": "grc", "greek": "ell",
-        # "ell": "ell", "modern_greek": "ell",
-        # "amh": "amh", "ethiopic": "amh",
-        # "ben": "ben", "bengali": "ben",
-        # "guj": "guj", "gujarati": "guj",
-        # "pan": "pan", "punjabi": "pan",
-        # "urd": "urd", "urdu": "urd",
-        # "syr": "syr", "syriac": "syr",
-        # "san": "san", "sanskrit": "san",
-        # "nep": "nep", "nepali": "nep",
-    }
-
-    for key, lang in lang_keywords.items():
-        if key in name:
-            return lang
-    return "eng"  # default fallback
-
-
 def ocr_image_file(file_path, lang="eng"):
     try:
         img = Image.open(file_path)
@@ -100,31 +48,25 @@ def ocr_image_file(file_path, lang="eng"):
         return ""
 
 
-def ocr_pdf_file(file_path, lang="eng"):
+def ocr_paged_file(file_path, lang="eng"):
+    """OCR every page of a PDF or DjVu on the shared page pool."""
     try:
-        doc = fitz.open(file_path)
-        return "\n\n".join(
-            pytesseract.image_to_string(
-                Image.open(io.BytesIO(page.get_pixmap(alpha=False).tobytes())),
-                lang=lang
-            ) for page in doc
-        )
+        with OCRScheduler(cache=open_default_cache()) as scheduler:
+            job = next(scheduler.run([OCRJob(file_path, Path(file_path), lang)]))
+        for page, error in job.errors.items():
+            print(f"[ERROR] OCR failed on {file_path} page {page}: {error}")
+        return job.text()
     except Exception as e:
-        print(f"[ERROR] OCR failed on PDF {file_path}: {e}")
+        print(f"[ERROR] OCR failed on {file_path}: {e}")
         return ""
 
 
+def ocr_pdf_file(file_path, lang="eng"):
+    return ocr_paged_file(file_path, lang)
+
+
 def ocr_djvu_file(file_path, lang="eng"):
-    png_path = file_path.with_suffix(".djvu.png")
-    try:
-        subprocess.run(["ddjvu", "-format=png", str(file_path), str(png_path)], check=True)
-        return ocr_image_file(png_path, lang)
-    except Exception as e:
-        print(f"[ERROR] OCR failed on DjVu file {file_path}: {e}")
-        return ""
-    finally:
-        if png_path.exists():
-            png_path.unlink()
+    return ocr_paged_file(file_path, lang)
 
 
 def ocr_file(file_path, lang=None):
@@ -161,44 +103,38 @@ def strip_timestamp_and_txt(txt_stem: str) -> str:
 # ========================================================================
 # ========================================================================
 # ======================================================================== 
-def append_missing_candidates(dst_dir: Path, src_dir: Path, pending_path: Path):
+def scan_empty_outputs(dst_dir: Path, src_dir: Path) -> list[tuple[Path, Path, str]]:
+    """One walk of each tree: (txt_path, src_path, base_filename) for every blank or partly scanned .txt with a source."""
+    blank_txts = find_ocr_texts(dst_dir)
+    if not blank_txts:
+        print(f"[INFO] No empty .txt files in {dst_dir}.")
+        return []
+    index = SourceIndex(src_dir)
+    print(f"[INFO] {len(blank_txts)} empty or partly scanned .txt files, {len(index)} source files indexed")
+
+    found = []
+    for txt_path in blank_txts:
+        full_stem = txt_path.stem  # e.g. "book.pdf_20250524_185119"
+        base_filename = strip_timestamp_and_txt(full_stem)  # e.g. "book.pdf"
+        rel_parent = txt_path.parent.relative_to(dst_dir).as_posix()
+        src_path = index.match(base_filename, rel_parent)
+        if src_path is not None:
+            found.append((txt_path, src_path, base_filename))
+    return found
+
+def append_missing_candidates(found: list[tuple[Path, Path, str]], pending_path: Path):
     pending_path.parent.mkdir(parents=True, exist_ok=True)
-
-    dst_files = sorted(dst_dir.rglob("*.txt"))
-    if not dst_files:
-        print(f"[INFO] No .txt files in {dst_dir}.")
-        return
-    
-    new_lines = []
-    for txt_path in dst_files:
-        # Consider empty .txt files only
-        if txt_path.stat().st_size == 0 or txt_path.read_text(encoding="utf-8").strip() == "":
-            full_stem = txt_path.stem  # e.g. "book.pdf_20250524_185119"
-            base_filename = strip_timestamp_and_txt(full_stem)  # e.g. "book.pdf"
-            
-            # Find the matching source file in src_dir (allowing any extension)
-            matches = list(src_dir.rglob(base_filename))
-            if not matches:
-                continue
-            src_path = matches[0]
-
-            line = f"{base_filename} | SRC: {src_path} | TXT: {txt_path} | SRC_EXISTS: {src_path.exists()}"
-            new_lines.append(line)
-
-            print(f"Found {len(new_lines)} candidates from empty txt files")
-
-    if new_lines:
+    if found:
         with pending_path.open("w", encoding="utf-8") as f:  # overwrite!
-            for line in new_lines:
-                f.write(line + "\n")
-        print(f"[INFO] Updated {len(new_lines)} OCR candidates in {pending_path}")
-        print("Searchnig...")
+            for txt_path, src_path, base_filename in found:
+                f.write(f"{base_filename} | SRC: {src_path} | TXT: {txt_path} | SRC_EXISTS: True\n")
+        print(f"[INFO] Updated {len(found)} OCR candidates in {pending_path}")
     else:
         print(f"[INFO] No empty .txt files to add.")
 # ========================================================================
 # ========================================================================
 # ========================================================================
-def find_ocr_candidates() -> list[tuple[Path, Path, str]]:
+def find_ocr_candidates(interactive: bool = True) -> list[tuple[Path, Path, str]]:
     if not DST_DIR.exists() or not SRC_DIR.exists():
         print(f"[ERROR] DST_DIR or SRC_DIR missing: {DST_DIR} / {SRC_DIR}")
         return []
@@ -206,35 +142,23 @@ def find_ocr_candidates() -> list[tuple[Path, Path, str]]:
     OCR_CANDIDATES.parent.mkdir(parents=True, exist_ok=True)
     OCRD_LOG.parent.mkdir(parents=True, exist_ok=True)
 
-    # Step 1: Update pending list
-    append_missing_candidates(DST_DIR, SRC_DIR, OCR_CANDIDATES)
+    # Step 1: Scan both trees once and update pending list
+    found = scan_empty_outputs(DST_DIR, SRC_DIR)
+    append_missing_candidates(found, OCR_CANDIDATES)
 
     already_ocrd = get_already_ocrd_stems(OCRD_LOG)
 
-    # Step 2: Find current empty .txt files
-    empty_txt_files = {
-        strip_timestamp_and_txt(f.stem): f
-        for f in DST_DIR.rglob("*.txt")
-        if f.stat().st_size == 0 or f.read_text(encoding="utf-8").strip() == ""
-    }
-
-    def matches(base_stem):
-        return list(SRC_DIR.rglob(base_stem + ".*"))
+    # Step 2: Drop candidates that were OCR'd before
+    candidates = [
+        (txt_file, src_file, base_stem)
+        for txt_file, src_file, base_stem in found
+        if base_stem not in already_ocrd
+    ]
 
-    candidates = []
-
-    for base_stem, txt_file in empty_txt_files.items():
-        src_matches = matches(base_stem)
-        if not src_matches:
-            continue
-        if base_stem not in already_ocrd:
-            candidates.append((txt_file, src_matches[0], base_stem))
-
-    # Step 3: Fallback if no fresh candidates
+    # Step 3: Fallback if no fresh candidates; the pending file is never pruned, so OCR'd ones are dropped again
     if not candidates:
         pending_from_file = get_ocr_candidates_pending(OCR_CANDIDATES)
         if pending_from_file:
-            print(f"[INFO] Using {len(pending_from_file)} existing OCR candidates from pending file.")
             for line in pending_from_file:
                 parts = line.split("|")
                 base = parts[0].strip()
@@ -244,14 +168,20 @@ def find_ocr_candidates() -> list[tuple[Path, Path, str]]:
                         src_path = Path(p.split("SRC:")[1].strip())
                     elif "TXT:" in p:
                         txt_path = Path(p.split("TXT:")[1].strip())
-                if src_path and txt_path:
+                if src_path and txt_path and base not in already_ocrd:
                     candidates.append((txt_path, src_path, base))
+            if not candidates:
+                print("[INFO] All pending OCR candidates were already OCR'd.")
+                return []
+            print(f"[INFO] Using {len(candidates)} of {len(pending_from_file)} existing OCR candidates from pending file.")
         else:
             print("[INFO] No OCR candidates found.")
             return []
 
     # Step 4: Confirm with user
     print(f"[INFO] Ready to OCR {len(candidates)} files.")
+    if not interactive:
+        return candidates
     confirm = input("Proceed with OCR? [Y/N]: ").strip().lower()
     if confirm != "y":
         print("[INFO] OCR aborted by user.")
@@ -261,31 +191,135 @@ def find_ocr_candidates() -> list[tuple[Path, Path, str]]:
 # ========================================================================
 # ========================================================================
 # ========================================================================
-def perform_ocr_workflow(ocr_candidates: list[tuple[Path, Path, str]]):
+def save_ocr_result(txt_file: Path, src_file: Path, base_stem: str, pages: list[str],
+                    statuses: list[str] | None = None, loader: str = "ocr") -> bool:
+    """Write the pages and their page index; statuses default to "ocr", or "blank" for empty pages."""
+    text, spans = join_pages(pages)
+    if not text.strip():
+        print(f"[WARN] No text extracted from {src_file}")
+        return False
+    statuses = statuses or ["ocr" if page.strip() else "blank" for page in pages]
+    textio.write_text(txt_file, text)  # atomic, the .txt only ever holds the complete result
+    write_page_index(txt_file, spans, loader, statuses)
+    with OCRD_LOG.open("a", encoding="utf-8") as log_f:
+        log_f.write(f"{base_stem}\n")
+    print(f"[OCR] OCR successful → {txt_file}")
+    return True
+
+def checkpoint_path_for(txt_file: Path) -> Path:
+    return txt_file.with_name(f".{txt_file.name}.ocr-pages.jsonl")
+
+def perform_ocr_workflow(ocr_candidates: list[tuple[Path, Path, str]], queue: OCRQueue | None = None,
+                         deadline: float | None = None):
+    """OCR candidates in the given order; queue gets every outcome, no new document starts after deadline."""
     if not ocr_candidates:
         print("[INFO] No OCR work to perform.")
         return
 
+    def finish(txt_file, status, error=None):
+        if queue is not None:
+            queue.mark(txt_file, status, error)
+
     replaced, skipped = 0, 0
+    # Pages of every PDF/DjVu/image go through one shared pool, other types are OCR'd one by one
+    jobs = []
     for txt_file, src_file, base_stem in ocr_candidates:
+        if src_file.suffix.lower() in PAGED_OCR_EXTENSIONS:
+            # With an OCR plan only the pages without a usable text layer are recognized
+            plan = read_ocr_plan(txt_file)
+            if plan and read_page_index(txt_file) is None:
+                # Older or partly copied output: nothing to merge the planned pages into
+                print(f"[WARN] {txt_file.name} has an OCR plan but no page index, OCR'ing the whole file")
+                plan = None
+            jobs.append(OCRJob((txt_file, base_stem, plan), src_file, detect_language_from_filename(src_file),
+                               pages=plan["pages"] if plan else None, checkpoint=checkpoint_path_for(txt_file)))
+            continue
         print(f"[OCR] Processing {src_file}")
-        text = ocr_file(src_file)
-        if text.strip():
-            txt_file.write_text(text, encoding="utf-8")
-            with OCRD_LOG.open("a", encoding="utf-8") as log_f:
-                log_f.write(f"{base_stem}\n")
-            print(f"[OCR] OCR successful → {txt_file}")
+        if save_ocr_result(txt_file, src_file, base_stem, [ocr_file(src_file)]):
+            finish(txt_file, "done")
             replaced += 1
         else:
-            print(f"[WARN] No text extracted from {src_file}")
+            finish(txt_file, "failed", "no text")
             skipped += 1
 
+    def until_deadline(jobs):
+        # The scheduler pulls jobs lazily, so stopping here only stops new documents
+        for job in jobs:
+            if deadline is not None and time.monotonic() > deadline:
+                print(f"[INFO] OCR deadline reached, {job.path.name} and later documents left queued")
+                return
+            yield job
+
+    print(f"[OCR] Processing {len(jobs)} documents page by page on {OCR_WORKERS} workers")
+    with OCRScheduler(cache=open_default_cache()) as scheduler:
+        for job in scheduler.run(until_deadline(jobs)):
+            txt_file, base_stem, plan = job.key
+            for page, error in job.errors.items():
+                print(f"[ERROR] OCR failed on {job.path} page {page}: {error}")
+            if job.resumed or job.cached:
+                print(f"[OCR] {job.path.name}: {job.resumed} pages resumed, {job.cached} from cache, {len(job.pages)} total")
+            if job.failed:
+                # Finished pages stay in the checkpoint, the next run only retries the failed ones
+                print(f"[WARN] {job.path.name} incomplete, {txt_file.name} left unchanged")
+                finish(txt_file, "failed", "; ".join(f"page {p}: {e}" for p, e in job.errors.items()))
+                skipped += 1
+                continue
+            if plan:
+                try:
+                    # OCR'd pages lose the running headers the text-layer pages already lost at extraction
+                    stripped = read_stripped_headers(txt_file)
+                    texts, dropped = strip_known_headers(job.texts, stripped)
+                    pages, statuses = merge_ocr_pages(txt_file, texts)
+                    loader = read_page_index(txt_file)["loader"]
+                except (OSError, ValueError, KeyError, IndexError) as e:
+                    # Pages stay in the checkpoint; without the plan the next run OCRs the whole file
+                    print(f"[ERROR] Cannot merge OCR pages into {txt_file}: {e}, whole file next run")
+                    ocr_plan_path(txt_file).unlink(missing_ok=True)
+                    finish(txt_file, "failed", f"merge: {e}")
+                    skipped += 1
+                    continue
+            else:
+                pages, statuses, loader = [job.texts[i] for i in sorted(job.texts)], None, "ocr"
+                stripped = dropped = []
+            if save_ocr_result(txt_file, job.path, base_stem, pages, statuses, loader):
+                if dropped:
+                    write_stripped_headers(txt_file, stripped + dropped)
+                job.checkpoint.remove()
+                ocr_plan_path(txt_file).unlink(missing_ok=True)
+                finish(txt_file, "done")
+                replaced += 1
+            else:
+                job.checkpoint.remove()
+                finish(txt_file, "failed", "no text")
+                skipped += 1
+        if scheduler.timings:
+            print("[OCR] Worker time: " + ", ".join(
+                f"{stage} {value:.1f}s" if stage != "blank_pages" else f"{value} blank pages skipped"
+                for stage, value in scheduler.timings.items()))
+
     print(f"[OCR] Done. Replaced: {replaced}, Skipped: {skipped}")
 
+def run_ocr_batch():
+    """Unattended OCR for extract.py and cron: queue new candidates, run the queue by OCR_POLICY."""
+    queue = OCRQueue(OCR_QUEUE, OCR_FOLDER_PRIORITY, OCR_MAX_ATTEMPTS)
+    try:
+        added = queue.enqueue(find_ocr_candidates(interactive=False))
+        rows = queue.pending(OCR_POLICY, OCR_PAGE_BUDGET)
+        pages = sum(row["pages"] or 0 for row in rows)
+        print(f"[INFO] OCR queue: {added} added, {len(rows)} jobs ({pages} pages) selected by {OCR_POLICY}, {queue.counts()}")
+        deadline = time.monotonic() + OCR_DEADLINE_MINUTES * 60 if OCR_DEADLINE_MINUTES else None
+        candidates = [(Path(row["txt_path"]), Path(row["src_path"]), row["base_stem"]) for row in rows]
+        perform_ocr_workflow(candidates, queue=queue, deadline=deadline)
+    finally:
+        queue.close()
+
 if __name__ == "__main__":
     try:
-        candidates = find_ocr_candidates()
-        perform_ocr_workflow(candidates)
+        if "--batch" in sys.argv[1:]:
+            run_ocr_batch()
+        else:
+            candidates = find_ocr_candidates()
+            perform_ocr_workflow(candidates)
     except Exception as e:
         print(f"[FATAL] Exception: {e}")
 '''
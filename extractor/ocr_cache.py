@@ -0,0 +1,119 @@
+"""
+    Page-level OCR result cache (SQLite).
+    One row per (source sha256, page index, engine settings), where the
+    settings key covers language, render settings and the Tesseract version.
+    Text is stored zlib-compressed; least recently used pages are evicted
+    once the stored size passes max_bytes. Detected document languages are
+    kept alongside, so script detection runs once per document.
+"""
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+EVICT_EVERY = 100  # check the size limit after this many inserts
+EVICT_TO = 0.9  # evict down to this fraction of max_bytes
+TOUCH_EVERY = 200  # last_used of cache hits is written in batches of this size, not one commit per page
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    sha256    TEXT NOT NULL,
+    page      INTEGER NOT NULL,
+    settings  TEXT NOT NULL,
+    text      BLOB NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (sha256, page, settings)
+);
+CREATE INDEX IF NOT EXISTS pages_last_used ON pages(last_used);
+CREATE TABLE IF NOT EXISTS languages (
+    sha256 TEXT NOT NULL,
+    hint   TEXT NOT NULL,
+    lang   TEXT NOT NULL,
+    PRIMARY KEY (sha256, hint)
+);
+"""
+
+
+def settings_key(lang: str, settings, engine_version: str) -> str:
+    return f"{lang}|{settings!r}|tesseract {engine_version}"
+
+
+class OCRCache:
+    def __init__(self, db_path: Path, max_bytes: int):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.inserts = 0
+        self.hits = 0
+        self.misses = 0
+        self.touched = {}  # (sha256, page, settings) → last use not yet written
+
+    def close(self):
+        self.flush_touches()
+        self.conn.close()
+
+    def flush_touches(self):
+        if not self.touched:
+            return
+        self.conn.executemany(
+            "UPDATE pages SET last_used = ? WHERE sha256 = ? AND page = ? AND settings = ?",
+            [(used, *key) for key, used in self.touched.items()],
+        )
+        self.conn.commit()
+        self.touched.clear()
+
+    def size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, sha256: str, page: int, settings: str) -> str | None:
+        key = (sha256, page, settings)
+        row = self.conn.execute(
+            "SELECT text FROM pages WHERE sha256 = ? AND page = ? AND settings = ?", key
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touched[key] = time.time()
+        if len(self.touched) >= TOUCH_EVERY:
+            self.flush_touches()
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, sha256: str, page: int, settings: str, text: str):
+        blob = zlib.compress(text.encode("utf-8"), 6)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (sha256, page, settings, text, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            (sha256, page, settings, blob, len(blob), time.time()),
+        )
+        self.conn.commit()
+        self.inserts += 1
+        if self.inserts % EVICT_EVERY == 0:
+            self.evict()
+
+    def get_language(self, sha256: str, hint: str) -> str | None:
+        row = self.conn.execute("SELECT lang FROM languages WHERE sha256 = ? AND hint = ?", (sha256, hint)).fetchone()
+        return row[0] if row else None
+
+    def put_language(self, sha256: str, hint: str, lang: str):
+        self.conn.execute("INSERT OR REPLACE INTO languages (sha256, hint, lang) VALUES (?, ?, ?)", (sha256, hint, lang))
+        self.conn.commit()
+
+    def evict(self) -> int:
+        """Drop least recently used pages until the cache fits; returns the number of pages removed."""
+        self.flush_touches()  # pages just read are not the least recently used
+        size = self.size()
+        if size <= self.max_bytes:
+            return 0
+        excess = size - int(self.max_bytes * EVICT_TO)
+        victims = []
+        for rowid, size in self.conn.execute("SELECT rowid, size FROM pages ORDER BY last_used"):
+            victims.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM pages WHERE rowid = ?", victims)
+        self.conn.commit()
+        return len(victims)
@@ -0,0 +1,58 @@
+"""
+    Per-document OCR checkpoints.
+    Finished pages are appended to a JSON-lines file as they come in, so an
+    interrupted run resumes from the pages already done. The first line
+    describes the source and settings; a checkpoint written for another
+    version of the file or other settings is discarded.
+"""
+import json
+import os
+from pathlib import Path
+
+
+class PageCheckpoint:
+    def __init__(self, path: Path, source: Path, settings: str):
+        self.path = Path(path)
+        stat = Path(source).stat()
+        self.header = {"source": str(source), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "settings": settings}
+        self.started = False  # file exists with our header and ends on a complete line
+
+    def load(self) -> dict[int, str]:
+        """Pages finished by an earlier run, empty if there is no usable checkpoint."""
+        if not self.path.exists():
+            return {}
+        pages = {}
+        torn = False
+        with self.path.open(encoding="utf-8") as f:
+            try:
+                if json.loads(f.readline()) != self.header:
+                    return {}
+                for line in f:
+                    entry = json.loads(line)
+                    pages[entry["page"]] = entry["text"]
+            except (json.JSONDecodeError, KeyError):
+                torn = True  # partial last line after a crash: keep what was read before it
+        if torn:
+            self._write(pages)
+        self.started = True
+        return pages
+
+    def _write(self, pages: dict[int, str]):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            f.write(json.dumps(self.header) + "\n")
+            for index, text in pages.items():
+                f.write(json.dumps({"page": index, "text": text}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+    def append(self, index: int, text: str):
+        if not self.started:
+            self._write({})
+            self.started = True
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"page": index, "text": text}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,250 @@
+"""
+    Page-level OCR primitives.
+    No environment or module-level side effects, so OCR worker processes
+    can import it cheaply. Every function works on (source path, page index).
+"""
+import io
+import os
+import re
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+
+from extractor.preprocess import preprocess
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp"}
+OPEN_DOCUMENTS = 2  # PDFs kept open per worker, pages of one book usually land on the same worker
+
+_open_pdfs = OrderedDict()
+
+
+class RenderSettings:
+    """
+    How a page is rasterized before recognition.
+    dpi: Tesseract works best at 300, lower is faster on clean print.
+    grayscale: one byte per pixel instead of three, Tesseract binarizes anyway.
+    clip: (x0, y0, x1, y1) to crop margins, None for the full page;
+          PDF points for PDFs, pixels of the rendered page for images and DjVu.
+    preprocess: extractor.preprocess steps run on the rendered page, () for none.
+    """
+    def __init__(self, dpi: int = 300, grayscale: bool = True, clip: tuple[float, float, float, float] | None = None,
+                 preprocess: tuple[str, ...] = ()):
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.clip = clip
+        self.preprocess = tuple(preprocess)
+
+    def __repr__(self):
+        return (f"RenderSettings(dpi={self.dpi}, grayscale={self.grayscale}, clip={self.clip}, "
+                f"preprocess={self.preprocess})")
+
+
+def pixmap_to_image(pix) -> Image.Image:
+    """
+    Copy the pixmap samples into an image without encoding. A copy, not a view:
+    the pixmap's memory is freed as soon as the caller drops it.
+    """
+    mode = "L" if pix.n == 1 else "RGB"
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples, "raw", mode, pix.stride)
+
+
+def open_pdf(path: Path):
+    key = str(path)
+    if key in _open_pdfs:
+        _open_pdfs.move_to_end(key)
+        return _open_pdfs[key]
+    doc = fitz.open(key)
+    _open_pdfs[key] = doc
+    while len(_open_pdfs) > OPEN_DOCUMENTS:
+        _open_pdfs.popitem(last=False)[1].close()
+    return doc
+
+
+def djvu_page_count(path: Path) -> int:
+    result = subprocess.run(["djvused", "-e", "n", str(path)], capture_output=True, text=True, check=True)
+    return int(result.stdout.strip())
+
+
+def render_djvu_page(path: Path, index: int, settings: RenderSettings) -> Image.Image:
+    """Render one DjVu page as PGM/PPM on ddjvu's stdout, nothing touches the disk."""
+    result = subprocess.run(
+        ["ddjvu", f"-format={'pgm' if settings.grayscale else 'ppm'}",
+         f"-page={index + 1}", f"-scale={settings.dpi}", str(path)],
+        capture_output=True, check=True,
+    )
+    return Image.open(io.BytesIO(result.stdout))
+
+
+def page_count(path: Path) -> int:
+    ext = path.suffix.lower()
+    if ext == ".djvu":
+        return djvu_page_count(path)
+    if ext == ".pdf":
+        with fitz.open(str(path)) as doc:
+            return doc.page_count
+    if ext in IMAGE_EXTENSIONS:
+        with Image.open(path) as img:
+            return getattr(img, "n_frames", 1)  # multi-page TIFF
+    raise ValueError(f"Unsupported file type for OCR: {path}")
+
+
+def render_page(path: Path, index: int, settings: RenderSettings | None = None) -> Image.Image:
+    settings = settings or RenderSettings()
+    ext = path.suffix.lower()
+    if ext == ".pdf":
+        page = open_pdf(path)[index]
+        pix = page.get_pixmap(
+            dpi=settings.dpi,
+            colorspace=fitz.csGRAY if settings.grayscale else fitz.csRGB,
+            clip=fitz.Rect(settings.clip) if settings.clip else None,
+            alpha=False,
+        )
+        return pixmap_to_image(pix)
+    if ext == ".djvu" or ext in IMAGE_EXTENSIONS:
+        if ext == ".djvu":
+            img = render_djvu_page(path, index, settings)
+        else:
+            img = Image.open(path)
+            img.seek(index)
+        if settings.clip:
+            img = img.crop(tuple(int(v) for v in settings.clip))
+        if settings.grayscale:
+            img = ppm_compatible(img)  # 16-bit scaled and alpha flattened first, a bare convert("L") clips them
+            return img if img.mode == "L" else img.convert("L")
+        return img
+    raise ValueError(f"Unsupported file type for OCR: {path}")
+
+
+def tesseract_version() -> str:
+    return str(pytesseract.get_tesseract_version())
+
+
+# Tesseract OSD script name -> language pack to use when the filename hint does not fit
+SCRIPT_LANGUAGES = {
+    "Latin": "eng", "Cyrillic": "rus", "Greek": "ell", "Arabic": "ara", "Hebrew": "heb",
+    "Han": "chi_sim", "Japanese": "jpn", "Hangul": "kor", "Devanagari": "hin", "Thai": "tha",
+}
+# Script of every language common.language can return from a filename
+LANGUAGE_SCRIPTS = {"eng": "Latin", "pol": "Latin", "nor": "Latin", "rus": "Cyrillic", "ukr": "Cyrillic", "bel": "Cyrillic"}
+OSD_SCRIPT = re.compile(r"Script: (\w+)\s+Script confidence: ([\d.]+)")
+
+
+def detect_script(path: Path, index: int, settings: RenderSettings | None = None) -> tuple[str, float] | None:
+    """(script, confidence) of one page from Tesseract OSD, None if OSD cannot tell (blank page, no osd data)."""
+    try:
+        osd = pytesseract.image_to_osd(render_page(path, index, settings), config="--psm 0")
+    except pytesseract.TesseractError:
+        return None
+    match = OSD_SCRIPT.search(osd)
+    return (match.group(1), float(match.group(2))) if match else None
+
+
+def choose_language(hint: str, script: str | None) -> str:
+    """Keep the single filename language when it is written in the detected script, else the script's language."""
+    if script is None or LANGUAGE_SCRIPTS.get(hint) == script:
+        return hint
+    return SCRIPT_LANGUAGES.get(script, hint)
+
+
+PPM_MODES = ("1", "L", "RGB")
+
+
+def ppm_compatible(img: Image.Image) -> Image.Image:
+    """Image in a mode PPM/PGM can store; PNG, GIF and TIFF pages may come in anything else."""
+    if img.mode in PPM_MODES:
+        return img
+    if img.mode in ("I", "F") or img.mode.startswith("I;16"):
+        return img.convert("I").point(lambda v: v * (1 / 256)).convert("L")  # 16-bit gray scaled, not clipped
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        # Transparent areas become paper, not black
+        rgba = img.convert("RGBA")
+        page = Image.new("RGB", rgba.size, "white")
+        page.paste(rgba, mask=rgba.getchannel("A"))
+        return page.convert("L") if img.mode == "LA" else page
+    return img.convert("RGB")
+
+
+class PytesseractBackend:
+    """One tesseract process per page via pytesseract, the reference behaviour."""
+    name = "pytesseract"
+
+    def recognize(self, images: list[Image.Image], lang: str) -> list[str]:
+        return [pytesseract.image_to_string(img, lang=lang) for img in images]
+
+
+class TesseractBatchBackend:
+    """
+    All pages of a chunk in one tesseract process through an image-list file,
+    so the language data is loaded once per chunk instead of once per page.
+    Tesseract ends every page with a form feed, which splits the output back.
+    """
+    name = "tesseract"
+
+    def recognize(self, images: list[Image.Image], lang: str) -> list[str]:
+        with tempfile.TemporaryDirectory(prefix="ocr_batch_") as tmp:
+            paths = []
+            for i, img in enumerate(images):
+                path = os.path.join(tmp, f"{i:05d}.pnm")
+                ppm_compatible(img).save(path, format="PPM")  # uncompressed, nothing to encode or decode
+                paths.append(path)
+            list_file = os.path.join(tmp, "pages.txt")
+            with open(list_file, "w", encoding="utf-8") as f:
+                f.write("\n".join(paths) + "\n")
+            result = subprocess.run(
+                [pytesseract.pytesseract.tesseract_cmd, list_file, "stdout", "-l", lang],
+                capture_output=True, check=True,
+                env={**os.environ, "OMP_THREAD_LIMIT": "1"},  # parallelism comes from the worker pool
+            )
+        texts = result.stdout.decode("utf-8", errors="replace").split("\f")
+        if len(texts) == len(images) + 1 and not texts[-1].strip():
+            texts.pop()
+        if len(texts) != len(images):
+            # Page separator disabled in a tesseract config: fall back to one process per page
+            return PytesseractBackend().recognize(images, lang)
+        return texts
+
+
+BACKENDS = {backend.name: backend for backend in (PytesseractBackend, TesseractBatchBackend)}
+
+
+def get_backend(name: str):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def ocr_pages(path: Path, indexes: list[int], lang: str = "eng", settings: RenderSettings | None = None,
+              backend: str = "pytesseract") -> tuple[list[str], dict[str, float]]:
+    """
+    Render, preprocess and recognize a chunk of pages of one document, runs inside OCR worker processes.
+    Returns (text per page, seconds per stage); pages found blank by preprocessing are "" without OCR.
+    """
+    settings = settings or RenderSettings()
+    timings = {"render": 0.0, "recognize": 0.0, "blank_pages": 0}
+    images = []
+    for index in indexes:
+        start = time.perf_counter()
+        img = render_page(path, index, settings)
+        timings["render"] += time.perf_counter() - start
+        img, step_timings = preprocess(img, settings.preprocess)
+        for step, seconds in step_timings.items():
+            timings[step] = timings.get(step, 0.0) + seconds
+        images.append(img)
+    live = [img for img in images if img is not None]
+    start = time.perf_counter()
+    texts = get_backend(backend).recognize(live, lang) if live else []
+    timings["recognize"] += time.perf_counter() - start
+    timings["blank_pages"] = len(images) - len(live)
+    texts = iter(texts)
+    return [next(texts) if img is not None else "" for img in images], timings
+
+
+def ocr_page(path: Path, index: int, lang: str = "eng", settings: RenderSettings | None = None,
+             backend: str = "pytesseract") -> str:
+    return ocr_pages(path, [index], lang, settings, backend)[0][0]
@@ -0,0 +1,134 @@
+"""
+    Persistent OCR job queue (SQLite).
+    One row per target .txt with its source, pages to OCR (the OCR plan for
+    hybrid outputs, else the whole document) and folder priority.
+    Jobs are handed out by a scheduling policy and an optional page budget,
+    and marked done or failed as they finish, so batch runs can be
+    interrupted, rerun from cron and retried without bookkeeping by hand.
+"""
+import sqlite3
+import time
+from pathlib import Path
+
+from common import textio
+from extractor import ocr_engine
+from extractor.dir_index import is_blank_text
+from extractor.page_quality import ocr_plan_path, read_ocr_plan
+
+POLICIES = {
+    "sjf": "pages IS NULL, pages, added",  # shortest job first: quick wins land early
+    "priority": "priority DESC, pages IS NULL, pages, added",
+    "fifo": "added",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    txt_path  TEXT PRIMARY KEY,
+    src_path  TEXT NOT NULL,
+    base_stem TEXT NOT NULL,
+    pages     INTEGER,
+    priority  INTEGER NOT NULL DEFAULT 0,
+    status    TEXT NOT NULL,
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    error     TEXT,
+    added     REAL NOT NULL,
+    updated   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+"""
+
+
+def parse_folder_priorities(spec: str) -> dict[str, int]:
+    """"rare_books=10,inbox=5" -> {"rare_books": 10, "inbox": 5}"""
+    priorities = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        folder, _, value = item.partition("=")
+        priorities[folder.strip()] = int(value or 1)
+    return priorities
+
+
+class OCRQueue:
+    def __init__(self, db_path: Path, folder_priorities: dict[str, int] | None = None, max_attempts: int = 3):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.folder_priorities = folder_priorities or {}
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def priority_of(self, src_path: Path) -> int:
+        return max((self.folder_priorities.get(part, 0) for part in Path(src_path).parts), default=0)
+
+    @staticmethod
+    def needs_ocr(txt_path: Path) -> bool:
+        """The text is missing or blank again (re-extracted), or has pages planned for OCR."""
+        if ocr_plan_path(txt_path).exists() or not textio.exists(txt_path):
+            return True
+        stored = textio.stored_path(txt_path)
+        return is_blank_text(stored, stored.stat().st_size)
+
+    @staticmethod
+    def job_pages(txt_path: Path, src_path: Path) -> int | None:
+        """Pages the job will OCR: the planned ones for hybrid outputs, else the whole document."""
+        plan = read_ocr_plan(Path(txt_path))
+        if plan:
+            return len(plan["pages"])
+        try:
+            return ocr_engine.page_count(Path(src_path))
+        except Exception:
+            return None  # unknown size goes last, the OCR run reports the real error
+
+    def enqueue(self, candidates: list[tuple[Path, Path, str]]) -> int:
+        """Add new candidates, requeue finished ones that came back blank; returns the number added."""
+        added = 0
+        now = time.time()
+        for txt_path, src_path, base_stem in candidates:
+            row = self.conn.execute("SELECT status FROM jobs WHERE txt_path = ?", (str(txt_path),)).fetchone()
+            if row is not None:
+                if row["status"] == "done" and self.needs_ocr(Path(txt_path)):
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'pending', attempts = 0, pages = ?, updated = ? WHERE txt_path = ?",
+                        (self.job_pages(txt_path, src_path), now, str(txt_path)),
+                    )
+                continue
+            pages = self.job_pages(txt_path, src_path)
+            self.conn.execute(
+                "INSERT INTO jobs (txt_path, src_path, base_stem, pages, priority, status, added, updated) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                (str(txt_path), str(src_path), base_stem, pages, self.priority_of(src_path), now, now),
+            )
+            added += 1
+        self.conn.commit()
+        return added
+
+    def pending(self, policy: str = "sjf", page_budget: int | None = None) -> list[sqlite3.Row]:
+        """Runnable jobs in policy order, cut off once page_budget pages are selected."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown OCR queue policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        rows = self.conn.execute(
+            f"SELECT * FROM jobs WHERE status IN ('pending', 'failed') AND attempts < ? ORDER BY {POLICIES[policy]}",
+            (self.max_attempts,),
+        ).fetchall()
+        if not page_budget:
+            return rows
+        selected, pages = [], 0
+        for row in rows:
+            if selected and pages + (row["pages"] or 0) > page_budget:
+                break
+            selected.append(row)
+            pages += row["pages"] or 0
+        return selected
+
+    def mark(self, txt_path: Path, status: str, error: str | None = None):
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, attempts = attempts + 1, updated = ? WHERE txt_path = ?",
+            (status, error, time.time(), str(txt_path)),
+        )
+        self.conn.commit()
+
+    def counts(self) -> dict[str, int]:
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
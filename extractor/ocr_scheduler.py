@@ -0,0 +1,212 @@
+"""
+    Page-level OCR scheduler.
+    Pages of one or many documents are fanned out to one shared process pool,
+    so a 600-page scan uses every core and small documents queued behind it
+    fill the gaps instead of waiting. Each worker renders and recognizes its
+    own chunk of pages, which overlaps rendering with recognition elsewhere.
+    Documents are handed back as soon as all their pages are in, text in page order.
+    Pages already in the OCR cache or in the job's checkpoint are filled in
+    without being submitted; every finished page is appended to the checkpoint.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from dotenv import load_dotenv
+from extractor import ocr_engine
+from extractor.manifest import file_sha256
+from extractor.ocr_cache import OCRCache, settings_key
+from extractor.ocr_checkpoint import PageCheckpoint
+load_dotenv()  # read at import, before the calling script loads .env
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS") or 0) or os.cpu_count()  # empty or 0: one per CPU
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() == "true"
+OCR_CACHE = os.getenv("OCR_CACHE", "logs/ocr_cache.sqlite")  # empty disables the cache
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "2048"))
+OCR_BACKEND = os.getenv("OCR_BACKEND", "tesseract")  # tesseract (batched) | pytesseract (one process per page)
+OCR_BATCH_PAGES = int(os.getenv("OCR_BATCH_PAGES", "8"))  # pages of one document per tesseract run
+OCR_PREPROCESS = tuple(filter(None, os.getenv("OCR_PREPROCESS", "").replace(" ", "").split(",")))  # e.g. grayscale,threshold,blank,deskew,crop
+OCR_DETECT_SCRIPT = os.getenv("OCR_DETECT_SCRIPT", "true").lower() == "true"  # pick languages from Tesseract OSD
+LANGUAGE_SAMPLE_PAGES = 2  # pages per document run through OSD
+PAGES_IN_FLIGHT = 4  # queued chunks per worker: cores never idle, futures stay bounded
+
+
+class OCRJob:
+    """
+    One document to OCR. pages=None means every page, settings=None the OCR_DPI/OCR_GRAYSCALE
+    defaults, checkpoint is the JSON-lines file finished pages are saved to (None for no checkpoint).
+    With detect_language lang is only a hint, replaced by the language of the detected script.
+    """
+    def __init__(self, key, path: Path, lang: str = "eng", pages: list[int] | None = None,
+                 settings: ocr_engine.RenderSettings | None = None, checkpoint: Path | None = None,
+                 detect_language: bool = OCR_DETECT_SCRIPT):
+        self.key = key
+        self.path = Path(path)
+        self.lang = lang
+        self.detect_language = detect_language
+        self.pages = pages
+        self.settings = settings or ocr_engine.RenderSettings(dpi=OCR_DPI, grayscale=OCR_GRAYSCALE, preprocess=OCR_PREPROCESS)
+        self.checkpoint_path = checkpoint
+        self.checkpoint = None
+        self.texts = {}   # page index -> text
+        self.errors = {}  # page index -> message, -1 for the whole document
+        self.cached = 0   # pages taken from the OCR cache
+        self.resumed = 0  # pages taken from the checkpoint
+        self.sha256 = None
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.errors)
+
+    def text(self) -> str:
+        return "\n\n".join(self.texts[i] for i in sorted(self.texts))
+
+
+def open_default_cache() -> OCRCache | None:
+    return OCRCache(Path(OCR_CACHE), OCR_CACHE_MAX_MB * 1024 * 1024) if OCR_CACHE else None
+
+
+class OCRScheduler:
+    """Owns its process pool and, if given, the OCR cache; both are closed with the scheduler."""
+    def __init__(self, workers: int = OCR_WORKERS, cache: OCRCache | None = None,
+                 backend: str = OCR_BACKEND, batch_pages: int = OCR_BATCH_PAGES):
+        ocr_engine.get_backend(backend)  # fail early on a typo, not in every worker
+        self.workers = max(1, workers)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.backend = backend
+        self.batch_pages = max(1, batch_pages)
+        self.cache = cache
+        self.engine_version = f"{ocr_engine.tesseract_version()} {backend}" if cache is not None else None
+        self.timings = {}  # stage -> seconds summed over all workers, plus blank_pages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close(cancel=exc[0] is not None)
+
+    def close(self, cancel: bool = False):
+        self.pool.shutdown(wait=True, cancel_futures=cancel)
+        if self.cache is not None:
+            self.cache.close()
+
+    def _settings_key(self, job):
+        return settings_key(job.lang, job.settings, self.engine_version)
+
+    def _cached_text(self, job, index):
+        if self.cache is None or job.sha256 is None:
+            return None
+        return self.cache.get(job.sha256, index, self._settings_key(job))
+
+    def _document_language(self, job) -> str:
+        """Script of a few sample pages decides the language for the whole document, cached by content."""
+        hint = job.lang
+        if self.cache is not None and job.sha256 is not None:
+            lang = self.cache.get_language(job.sha256, hint)
+            if lang is not None:
+                return lang
+        step = max(1, len(job.pages) // (LANGUAGE_SAMPLE_PAGES + 1))
+        samples = job.pages[step::step][:LANGUAGE_SAMPLE_PAGES] or job.pages[:1]  # skip covers and title pages
+        futures = [self.pool.submit(ocr_engine.detect_script, job.path, index, job.settings) for index in samples]
+        detected = []
+        for future in futures:
+            try:
+                if (result := future.result()) is not None:
+                    detected.append(result)
+            except Exception:
+                pass  # a page that cannot be rendered fails again, with its error, when it is OCR'd
+        script = max(detected, key=lambda result: result[1])[0] if detected else None
+        lang = ocr_engine.choose_language(hint, script)
+        if self.cache is not None and job.sha256 is not None:
+            self.cache.put_language(job.sha256, hint, lang)
+        return lang
+
+    def _page_tasks(self, jobs):
+        for job in jobs:
+            try:
+                if job.pages is None:
+                    job.pages = list(range(ocr_engine.page_count(job.path)))
+                if self.cache is not None:
+                    job.sha256 = file_sha256(job.path)
+                if job.detect_language and job.pages:
+                    job.lang = self._document_language(job)
+                if job.checkpoint_path is not None:
+                    job.checkpoint = PageCheckpoint(job.checkpoint_path, job.path, f"{job.lang}|{job.settings!r}")
+                    saved = job.checkpoint.load()
+                    job.texts.update((i, saved[i]) for i in job.pages if i in saved)
+                    job.resumed = len(job.texts)
+            except Exception as e:
+                job.errors[-1] = f"{type(e).__name__}: {e}"
+                job.pages = []
+            pending = [i for i in job.pages if i not in job.texts]
+            if not pending:
+                yield job, None  # nothing (left) to OCR, finished right away
+            for index in pending:
+                yield job, index
+
+    def _submit(self, job, indexes):
+        return self.pool.submit(ocr_engine.ocr_pages, job.path, indexes, job.lang, job.settings, self.backend)
+
+    def run(self, jobs):
+        """Yield every OCRJob once all of its pages are recognized, in completion order."""
+        tasks = self._page_tasks(jobs)
+        in_flight = {}   # future -> (job, page indexes)
+        finished = []
+        limit = self.workers * PAGES_IN_FLIGHT
+
+        def page_done(job, index, text):
+            job.texts[index] = text
+            if job.checkpoint is not None and index not in job.errors:
+                job.checkpoint.append(index, text)
+            if len(job.texts) == len(job.pages):
+                finished.append(job)
+
+        def fill():
+            chunk_job, chunk = None, []  # consecutive uncached pages of one document
+            while len(in_flight) < limit:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                job, index = task
+                if index is None:
+                    finished.append(job)
+                    continue
+                text = self._cached_text(job, index)
+                if text is not None:
+                    job.cached += 1
+                    page_done(job, index, text)
+                    continue
+                if chunk and chunk_job is not job:
+                    in_flight[self._submit(chunk_job, chunk)] = (chunk_job, chunk)
+                    chunk = []
+                chunk_job = job
+                chunk.append(index)
+                if len(chunk) == self.batch_pages:
+                    in_flight[self._submit(job, chunk)] = (job, chunk)
+                    chunk = []
+            if chunk:
+                in_flight[self._submit(chunk_job, chunk)] = (chunk_job, chunk)
+
+        fill()
+        while in_flight or finished:
+            yield from finished
+            finished.clear()
+            if not in_flight:
+                fill()
+                continue
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, indexes = in_flight.pop(future)
+                try:
+                    texts, timings = future.result()
+                    for stage, value in timings.items():
+                        self.timings[stage] = self.timings.get(stage, 0) + value
+                except Exception as e:
+                    texts = [""] * len(indexes)
+                    job.errors.update((index, f"{type(e).__name__}: {e}") for index in indexes)
+                for index, text in zip(indexes, texts):
+                    if self.cache is not None and job.sha256 is not None and index not in job.errors:
+                        self.cache.put(job.sha256, index, self._settings_key(job), text)
+                    page_done(job, index, text)
+            fill()
@@ -0,0 +1,83 @@
+"""
+    Page index sidecar for extracted text.
+    "book.pdf.txt" gets "book.pdf.pages.json": the loader that produced it
+    and, per page, [byte offset, byte length, status] into the .txt, where
+    status is "text" (text layer), "ocr" (recognized), "ocr_pending" (queued
+    for OCR) or "blank". PagedText reads single pages with one seek
+    (offsets are into the uncompressed text, see common.textio).
+"""
+import json
+import os
+from pathlib import Path
+
+from common.textio import open_text
+
+PAGE_SEPARATOR = "\n\n"
+
+
+def page_index_path(txt_path: Path) -> Path:
+    return Path(txt_path).with_suffix(".pages.json")  # "book.pdf.txt" → "book.pdf.pages.json"
+
+
+def join_pages(pages: list[str], separator: str = PAGE_SEPARATOR) -> tuple[str, list[tuple[int, int]]]:
+    """Text of all pages plus (byte offset, byte length) of each, as write_pages in extract.py lays them out."""
+    spans = []
+    offset = 0
+    sep_bytes = len(separator.encode("utf-8"))
+    for i, page in enumerate(pages):
+        if i:
+            offset += sep_bytes
+        length = len(page.encode("utf-8"))
+        spans.append((offset, length))
+        offset += length
+    return separator.join(pages), spans
+
+
+def write_page_index(txt_path: Path, spans: list[tuple[int, int]], loader: str, statuses: list[str]):
+    index_path = page_index_path(txt_path)
+    tmp_path = index_path.with_name(f".{index_path.name}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"loader": loader,
+                   "pages": [[offset, length, status] for (offset, length), status in zip(spans, statuses)]},
+                  f, separators=(",", ":"))
+    os.replace(tmp_path, index_path)
+
+
+def read_page_index(txt_path: Path) -> dict | None:
+    index_path = page_index_path(txt_path)
+    if not index_path.exists():
+        return None
+    with index_path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+class PagedText:
+    """Random access by page to a .txt that has a page index."""
+    def __init__(self, txt_path: Path):
+        self.txt_path = Path(txt_path)
+        index = read_page_index(self.txt_path)
+        if index is None:
+            raise FileNotFoundError(f"No page index for {self.txt_path}")
+        self.loader = index["loader"]
+        self.entries = index["pages"]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def status(self, page: int) -> str:
+        return self.entries[page][2]
+
+    def page(self, page: int) -> str:
+        offset, length, _ = self.entries[page]
+        with open_text(self.txt_path, "rb") as f:
+            f.seek(offset)
+            return f.read(length).decode("utf-8")
+
+    def pages(self, status: str | None = None):
+        """Yield (page number, text), optionally only pages with the given status."""
+        with open_text(self.txt_path, "rb") as f:
+            for number, (offset, length, page_status) in enumerate(self.entries):
+                if status is not None and page_status != status:
+                    continue
+                f.seek(offset)
+                yield number, f.read(length).decode("utf-8")
@@ -0,0 +1,143 @@
+"""
+    Per-page text-layer checks for hybrid extraction.
+    A PDF page keeps its text layer when it has enough clean characters;
+    pages that are mostly image or whose text layer is junk go to OCR.
+    Only cheap signals: character classes, an optional word list and PyMuPDF
+    image bounding boxes.
+    extract.py leaves an OCR plan next to the .txt ("book.pdf.ocr_pages.json",
+    the pages to OCR); ocr.py merges them back using the page index.
+"""
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+from extractor.page_index import PagedText
+
+MIN_PAGE_CHARS = 40  # fewer non-space characters than this is not a usable text layer
+MAX_GARBAGE_RATIO = 0.25  # share of junk characters above which a text layer is broken
+MIN_IMAGE_COVERAGE = 0.3  # share of the page covered by images that suggests a scan
+MIN_ALNUM_SHARE = 0.6  # prose and tables are ~80% letters/digits among visible characters, junk far less
+QUALITY_MIN_WORDS = 20  # dictionary hit rate is noise on fewer words
+
+CID_PATTERN = re.compile(r"\(cid:\d+\)")  # glyphs without a ToUnicode map, as pdfminer/pypdf print them
+MOJIBAKE_PATTERN = re.compile("[\u00c2\u00c3][\u0080-\u00bf]|\u00e2\u20ac")  # UTF-8 read as Latin-1/cp1252: "Ã©", "â€"
+WORD_PATTERN = re.compile(r"[^\W\d_]{2,}")
+
+
+def is_garbage_char(ch: str) -> bool:
+    if ch == "\ufffd":
+        return True
+    category = unicodedata.category(ch)
+    return category in ("Cc", "Co", "Cs", "Cn") and ch not in "\n\r\t\f"
+
+
+def garbage_ratio(text: str) -> float:
+    """Share of non-space characters that are replacement, control, private-use, mojibake or (cid:N) junk."""
+    cid_chars = sum(len(m) for m in CID_PATTERN.findall(text))
+    text = CID_PATTERN.sub("", text)
+    mojibake_chars = sum(len(m) for m in MOJIBAKE_PATTERN.findall(text))
+    visible = [ch for ch in text if not ch.isspace()]
+    total = len(visible) + cid_chars
+    if not total:
+        return 0.0
+    return min(1.0, (sum(map(is_garbage_char, visible)) + cid_chars + mojibake_chars) / total)
+
+
+def load_wordlist(path: Path, limit: int = 100_000) -> frozenset[str]:
+    """First column of a word list or SymSpell frequency dictionary, the limit most frequent words."""
+    words = set()
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            if line.strip():
+                words.add(line.split()[0].lower())
+            if len(words) >= limit:
+                break
+    return frozenset(words)
+
+
+def text_quality(text: str, words: frozenset[str] | None = None) -> float | None:
+    """
+    0..1 score of an extracted text, None for blank text. Product of three signals:
+    clean share (1 - garbage_ratio), letter/digit share against MIN_ALNUM_SHARE and,
+    with a word list and enough words, the dictionary hit rate.
+    """
+    visible = [ch for ch in text if not ch.isspace()]
+    if not visible:
+        return None
+    alnum = sum(ch.isalnum() for ch in visible)
+    score = (1 - garbage_ratio(text)) * min(1.0, alnum / len(visible) / MIN_ALNUM_SHARE)
+    if words is not None:
+        tokens = WORD_PATTERN.findall(text)
+        if len(tokens) >= QUALITY_MIN_WORDS:
+            score *= sum(token.lower() in words for token in tokens) / len(tokens)
+    return score
+
+
+def file_quality(page_scores: list[float | None], page_weights: list[int]) -> float | None:
+    """Mean page score weighted by page length, blank pages left out."""
+    scored = [(score, weight) for score, weight in zip(page_scores, page_weights) if score is not None]
+    total = sum(weight for _, weight in scored)
+    if not total:
+        return None
+    return sum(score * weight for score, weight in scored) / total
+
+
+def image_coverage(page) -> float:
+    """Share of a PyMuPDF page covered by images, overlaps counted once per image."""
+    page_rect = page.rect
+    area = page_rect.width * page_rect.height
+    if not area:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        bbox = page_rect & info["bbox"]  # clip to the page
+        if not bbox.is_empty:
+            covered += bbox.width * bbox.height
+    return min(1.0, covered / area)
+
+
+def classify_page(text: str, coverage: float) -> str:
+    """"text" keeps the text layer, "ocr" needs recognition, "blank" has nothing either way."""
+    chars = sum(1 for ch in text if not ch.isspace())
+    broken = garbage_ratio(text) > MAX_GARBAGE_RATIO
+    if chars >= MIN_PAGE_CHARS and not broken:
+        return "text"
+    if coverage >= MIN_IMAGE_COVERAGE or (chars and broken):
+        return "ocr"
+    return "blank" if not chars else "text"
+
+
+def ocr_plan_path(txt_path: Path) -> Path:
+    return Path(txt_path).with_suffix(".ocr_pages.json")  # "book.pdf.txt" → "book.pdf.ocr_pages.json"
+
+
+def write_ocr_plan(txt_path: Path, pages: list[int]):
+    plan_path = ocr_plan_path(txt_path)
+    if not pages:
+        plan_path.unlink(missing_ok=True)  # drop a plan left by an earlier extraction
+        return
+    with plan_path.open("w", encoding="utf-8") as f:
+        json.dump({"pages": pages}, f)
+
+
+def read_ocr_plan(txt_path: Path) -> dict | None:
+    plan_path = ocr_plan_path(txt_path)
+    if not plan_path.exists():
+        return None
+    with plan_path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def merge_ocr_pages(txt_path: Path, texts: dict[int, str]) -> tuple[list[str], list[str]]:
+    """(page texts, page statuses): text-layer pages from the .txt, OCR pages from texts, in page order."""
+    paged = PagedText(txt_path)
+    pages, statuses = [], []
+    for number, text in paged.pages():
+        if number in texts:
+            pages.append(texts[number])
+            statuses.append("ocr" if texts[number].strip() else "blank")
+        else:
+            pages.append(text)
+            statuses.append(paged.status(number))
+    return pages, statuses
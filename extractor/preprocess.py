@@ -0,0 +1,126 @@
+"""
+    Page image preprocessing before OCR, vectorized with NumPy.
+    Steps run in a fixed order and each one is optional:
+    grayscale → threshold (adaptive, integral-image mean) → blank (skip empty pages)
+    → deskew (projection profile) → crop (scanner borders and margins).
+    Runs inside OCR worker processes; every step reports its own time.
+"""
+import time
+
+import numpy as np
+from PIL import Image
+
+STEPS = ("grayscale", "threshold", "blank", "deskew", "crop")
+
+THRESHOLD_WINDOW = 1 / 40  # local mean window as a share of the page width
+THRESHOLD_OFFSET = 0.15  # a pixel is ink when darker than (1 - offset) * local mean
+BLANK_INK_RATIO = 0.002  # pages with less ink than this are not OCR'd at all
+DESKEW_MAX_ANGLE = 5.0  # degrees searched both ways
+DESKEW_STEP = 0.25
+DESKEW_WIDTH = 800  # the angle search runs on a downscaled copy
+BORDER_INK_RATIO = 0.5  # edge rows/columns darker than this are scanner border, not text
+CROP_MARGIN = 10  # pixels of white kept around the text block
+
+
+def to_gray(img: Image.Image) -> np.ndarray:
+    return np.asarray(img if img.mode == "L" else img.convert("L"))
+
+
+def adaptive_threshold(gray: np.ndarray) -> np.ndarray:
+    """Bradley-style local mean threshold; returns 0 for ink, 255 for paper."""
+    h, w = gray.shape
+    half = max(1, int(w * THRESHOLD_WINDOW) // 2)
+    integral = np.zeros((h + 1, w + 1), dtype=np.int64)
+    integral[1:, 1:] = gray.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+    y0 = np.clip(np.arange(h) - half, 0, h)[:, None]
+    y1 = np.clip(np.arange(h) + half + 1, 0, h)[:, None]
+    x0 = np.clip(np.arange(w) - half, 0, w)[None, :]
+    x1 = np.clip(np.arange(w) + half + 1, 0, w)[None, :]
+    area = (y1 - y0) * (x1 - x0)
+    window_sum = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    ink = gray.astype(np.int64) * area < window_sum * (1 - THRESHOLD_OFFSET)
+    return np.where(ink, 0, 255).astype(np.uint8)
+
+
+def ink_ratio(page: np.ndarray) -> float:
+    return float(np.count_nonzero(page < 128)) / page.size if page.size else 0.0
+
+
+def skew_angle(page: np.ndarray) -> float:
+    """Angle whose rotation makes text lines horizontal: the row-sum profile is sharpest there."""
+    img = Image.fromarray(page)
+    if img.width > DESKEW_WIDTH:
+        img = img.resize((DESKEW_WIDTH, max(1, img.height * DESKEW_WIDTH // img.width)))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP):
+        rotated = np.asarray(img.rotate(float(angle), resample=Image.NEAREST, fillcolor=255))
+        profile = np.count_nonzero(rotated < 128, axis=1).astype(np.float64)
+        score = float(np.square(np.diff(profile)).sum())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def deskew(page: np.ndarray) -> np.ndarray:
+    angle = skew_angle(page)
+    if not angle:
+        return page
+    return np.asarray(Image.fromarray(page).rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255))
+
+
+def crop_borders(page: np.ndarray) -> np.ndarray:
+    """Cut dark scanner borders at the edges, then crop to the ink bounding box plus a margin."""
+    ink = page < 128
+    rows = ink.mean(axis=1)
+    cols = ink.mean(axis=0)
+    top, bottom, left, right = 0, len(rows), 0, len(cols)
+    while top < bottom and rows[top] > BORDER_INK_RATIO:
+        top += 1
+    while bottom > top and rows[bottom - 1] > BORDER_INK_RATIO:
+        bottom -= 1
+    while left < right and cols[left] > BORDER_INK_RATIO:
+        left += 1
+    while right > left and cols[right - 1] > BORDER_INK_RATIO:
+        right -= 1
+    inner = ink[top:bottom, left:right]
+    ys = np.flatnonzero(inner.any(axis=1))
+    xs = np.flatnonzero(inner.any(axis=0))
+    if not len(ys) or not len(xs):
+        return page[top:bottom, left:right]
+    y0, y1 = max(0, ys[0] - CROP_MARGIN), min(inner.shape[0], ys[-1] + 1 + CROP_MARGIN)
+    x0, x1 = max(0, xs[0] - CROP_MARGIN), min(inner.shape[1], xs[-1] + 1 + CROP_MARGIN)
+    return page[top + y0:top + y1, left + x0:left + x1]
+
+
+def preprocess(img: Image.Image, steps: tuple[str, ...]) -> tuple[Image.Image | None, dict[str, float]]:
+    """
+    Run the enabled steps on one page. Returns (image, seconds per step);
+    image is None when the blank step finds no ink and the page should not be OCR'd.
+    """
+    timings = {}
+    if not steps:
+        return img, timings
+    unknown = set(steps) - set(STEPS)
+    if unknown:
+        raise ValueError(f"Unknown preprocessing steps {sorted(unknown)}, expected some of {', '.join(STEPS)}")
+
+    def timed(step, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[step] = time.perf_counter() - start
+        return result
+
+    page = None
+    if "grayscale" in steps or "threshold" in steps:
+        page = timed("grayscale", to_gray, img)
+    if "threshold" in steps:
+        page = timed("threshold", adaptive_threshold, page)
+    if "blank" in steps:
+        binary = page if "threshold" in steps else adaptive_threshold(to_gray(img))
+        if timed("blank", ink_ratio, binary) < BLANK_INK_RATIO:
+            return None, timings
+    if "deskew" in steps:
+        page = timed("deskew", deskew, page if page is not None else to_gray(img))
+    if "crop" in steps:
+        page = timed("crop", crop_borders, page if page is not None else to_gray(img))
+    return (Image.fromarray(page) if page is not None else img), timings
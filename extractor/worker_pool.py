@@ -0,0 +1,98 @@
+"""
+    Process-isolated task runner with hard per-task timeouts.
+    Every task runs in its own forked process and process group, so a hung
+    loader, including its djvutxt/ebook-convert children, can be killed
+    without taking the run down. Results are yielded as tasks complete.
+"""
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+
+CONTEXT = multiprocessing.get_context("fork")
+
+
+def _child(conn, func, task):
+    os.setsid()  # own process group, killpg() then reaches subprocesses too
+    try:
+        conn.send(("ok", func(task)))
+    except BaseException as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        process.kill()
+    process.join()
+
+
+def run_inline(tasks, func):
+    """Same contract as run_isolated, in the current process and without timeouts."""
+    for task in tasks:
+        try:
+            yield task, "ok", func(task)
+        except Exception as e:
+            yield task, "error", f"{type(e).__name__}: {e}"
+
+
+def run_isolated(tasks, func, workers: int, timeout: float | None = None):
+    """
+    Run func(task) for every task in at most `workers` processes at a time.
+    Yields (task, status, value) with status "ok" (value = return value),
+    "error" (value = message), "timeout" or "crashed".
+    func must return something picklable; keep it small, e.g. a status dict.
+    """
+    workers = max(1, workers)  # 0 from EXTRACT_WORKERS with a timeout still means one isolated worker
+    pending = iter(tasks)
+    running = {}  # conn -> (process, task, deadline)
+
+    def start_next():
+        for task in pending:
+            parent_conn, child_conn = CONTEXT.Pipe(duplex=False)
+            process = CONTEXT.Process(target=_child, args=(child_conn, func, task), daemon=True)
+            process.start()
+            child_conn.close()
+            deadline = time.monotonic() + timeout if timeout else None
+            running[parent_conn] = (process, task, deadline)
+            return True
+        return False
+
+    try:
+        while len(running) < workers and start_next():
+            pass
+
+        while running:
+            deadlines = [d for _, _, d in running.values() if d is not None]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait(list(running), timeout=wait_for)
+
+            for conn in ready:
+                process, task, _ = running.pop(conn)
+                try:
+                    status, value = conn.recv()
+                except EOFError:
+                    process.join()
+                    status, value = "crashed", f"worker exited with code {process.exitcode}"
+                conn.close()
+                process.join()
+                yield task, status, value
+                start_next()
+
+            now = time.monotonic()
+            for conn, (process, task, deadline) in list(running.items()):
+                if deadline is not None and now >= deadline:
+                    running.pop(conn)
+                    _kill(process)
+                    conn.close()
+                    yield task, "timeout", f"no result after {timeout}s"
+                    start_next()
+    finally:
+        # Ctrl+C or an abandoned generator: do not leave workers behind
+        for conn, (process, _, _) in running.items():
+            _kill(process)
+            conn.close()